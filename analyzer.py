@@ -1,12 +1,33 @@
 """
 Analyseur d'écarts entre numéros
 """
-from config import CATEGORIES
+from array import array
+from itertools import accumulate
+from operator import sub
+from config import CATEGORIES, get_current_journee
+from metrics import ANALYZE_SECONDS
+
+try:
+    import numpy as np
+except ImportError:  # numpy est optionnel (voir BatchGapEngine)
+    np = None
+
+def numbers_from_gaps(gaps, max_gap_pair):
+    """
+    Reconstitue les numéros d'une catégorie de l'historique, où seuls les
+    écarts et la paire du max (première occurrence) sont enregistrés
+    """
+    if not gaps or not max_gap_pair:
+        return []
+    first = max_gap_pair[0] - sum(gaps[:gaps.index(max(gaps))])
+    return list(accumulate(gaps, initial=first))
+
 
 class GapAnalyzer:
     def __init__(self):
         pass
     
+    @ANALYZE_SECONDS.time(analyzer='full')
     def analyze_all_categories(self, data):
         """
         Analyse toutes les catégories et calcule les écarts
@@ -64,4 +85,282 @@ class GapAnalyzer:
                 }
         
         return comparison
-        
+
+
+class IncrementalGapAnalyzer(GapAnalyzer):
+    """
+    Analyseur avec état pour les messages cumulatifs de la journée.
+
+    Pour chaque catégorie on garde le nombre de numéros traités, le premier
+    et le dernier, les écarts calculés et le max courant. Si le nouveau
+    message prolonge la liste précédente, seuls les numéros ajoutés sont
+    traités ; sinon (nouvelle journée, liste raccourcie ou modifiée) on
+    recalcule tout.
+
+    Le prolongement est vérifié en temps constant : même premier numéro,
+    même numéro à l'ancienne fin et même paire à la position du max. Une
+    correction ailleurs dans la liste déjà traitée n'est pas détectée.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.journee = None
+        self.states = {}
+
+    @ANALYZE_SECONDS.time(analyzer='incremental')
+    def analyze_all_categories(self, data):
+        journee = get_current_journee()
+        if journee != self.journee:
+            self.journee = journee
+            self.states = {}
+
+        results = {}
+
+        for category_name, numbers in data['categories'].items():
+            gaps, max_gap, max_gap_pair = self.update_category(category_name, numbers)
+            emoji = CATEGORIES[category_name]['emoji']
+
+            results[category_name] = {
+                'emoji': emoji,
+                'numbers': numbers,
+                'count': len(numbers),
+                'gaps': gaps,
+                'max_gap': max_gap,
+                'max_gap_pair': max_gap_pair
+            }
+
+        return results
+
+    def update_category(self, category_name, numbers):
+        """
+        Met à jour l'état d'une catégorie et retourne (gaps, max_gap, max_gap_pair).
+        gaps est un tuple partagé entre les appels tant que la liste ne change pas.
+        """
+        state = self.states.get(category_name)
+
+        if state is None or not self._extends(state, numbers):
+            state = {
+                'count': 0,
+                'first': None,
+                'last': None,
+                'gaps': [],
+                'snapshot': (),
+                'max_gap': None,
+                'max_gap_index': None
+            }
+            self.states[category_name] = state
+            if numbers:
+                state['count'] = 1
+                state['first'] = state['last'] = numbers[0]
+
+        gaps = state['gaps']
+        start = state['count']
+
+        if len(numbers) > start:
+            max_gap = state['max_gap']
+            max_gap_index = state['max_gap_index']
+            previous = state['last']
+
+            # Seuls les numéros ajoutés depuis le dernier message sont parcourus
+            for i in range(start, len(numbers)):
+                number = numbers[i]
+                gap = number - previous
+                gaps.append(gap)
+                if max_gap is None or gap > max_gap:
+                    max_gap = gap
+                    max_gap_index = i - 1
+                previous = number
+
+            state['count'] = len(numbers)
+            state['last'] = previous
+            state['max_gap'] = max_gap
+            state['max_gap_index'] = max_gap_index
+            state['snapshot'] = tuple(gaps)
+
+        max_gap = state['max_gap']
+        if max_gap is None:
+            return state['snapshot'], 0, None
+        index = state['max_gap_index']
+        return state['snapshot'], max_gap, (numbers[index], numbers[index + 1])
+
+    def _extends(self, state, numbers):
+        """Vrai si numbers prolonge la liste déjà analysée (premier, dernier et max inchangés)"""
+        count = state['count']
+        if count == 0 or len(numbers) < count:
+            return False
+        if numbers[0] != state['first'] or numbers[count - 1] != state['last']:
+            return False
+        index = state['max_gap_index']
+        return index is None or numbers[index + 1] - numbers[index] == state['max_gap']
+
+
+class BatchGapEngine:
+    """
+    Calcul groupé des écarts pour plusieurs jeux de données (jours, heures...).
+
+    Avec numpy, toutes les listes de numéros sont concaténées dans un seul
+    tableau `array` d'entiers et les écarts, max et paires sont calculés en
+    une fois (diff / reduceat) ; sans numpy chaque liste est traitée à part.
+    Les clés communes avec analyze_all_categories ont les mêmes valeurs ;
+    on ajoute 'mean_gap' et 'percentiles'.
+    """
+
+    PERCENTILES = (50, 90, 99)
+
+    def __init__(self, percentiles=PERCENTILES, use_numpy=None):
+        self.percentiles = tuple(percentiles)
+        self.use_numpy = np is not None if use_numpy is None else (use_numpy and np is not None)
+
+    def analyze_many(self, datasets):
+        """
+        datasets: {clé: data} où data a le format attendu par
+        analyze_all_categories ({'categories': {nom: [numéros]}})
+        Retourne {clé: {catégorie: résultat}}
+        """
+        values = array('q')
+        segments = []
+        for key, data in datasets.items():
+            for category_name, numbers in data['categories'].items():
+                start = len(values)
+                if self.use_numpy:
+                    values.extend(numbers)
+                segments.append((key, category_name, numbers, start, start + len(numbers)))
+
+        if self.use_numpy:
+            stats = self._segment_stats_numpy(values, segments)
+        else:
+            stats = self._segment_stats_lists(segments)
+
+        results = {key: {} for key in datasets}
+        for (key, category_name, numbers, start, end), stat in zip(segments, stats):
+            gaps, max_gap, max_gap_pair, mean_gap, percentiles = stat
+            results[key][category_name] = {
+                'emoji': CATEGORIES[category_name]['emoji'],
+                'numbers': numbers,
+                'count': len(numbers),
+                'gaps': gaps,
+                'max_gap': max_gap,
+                'max_gap_pair': max_gap_pair,
+                'mean_gap': mean_gap,
+                'percentiles': percentiles
+            }
+        return results
+
+    def analyze_history(self, historique):
+        """
+        Recalcule les statistiques de chaque journée d'un historique
+        {journée: {heure: {'timestamp', 'gaps': {catégorie: {...}}}}}.
+        Les messages étant cumulatifs, la dernière heure enregistrée d'une
+        catégorie contient tous ses numéros de la journée.
+        Retourne {journée: {catégorie: résultat}} comme analyze_many.
+        """
+        datasets = {}
+        for journee, hours in historique.items():
+            latest = {}
+            for hour in sorted(hours, key=lambda h: (hours[h].get('timestamp') or '', h)):
+                latest.update(hours[hour].get('gaps', {}))
+            datasets[journee] = {'categories': {
+                category_name: numbers_from_gaps(data.get('gaps', []), data.get('max_gap_pair'))
+                for category_name, data in latest.items()
+                if category_name in CATEGORIES
+            }}
+        return self.analyze_many(datasets)
+
+    def _empty_stat(self):
+        return [], 0, None, 0.0, {p: 0.0 for p in self.percentiles}
+
+    def _percentiles(self, sorted_gaps, offset, count):
+        """Percentiles par interpolation linéaire sur une liste triée"""
+        result = {}
+        for p in self.percentiles:
+            position = (count - 1) * p / 100
+            low = int(position)
+            high = min(low + 1, count - 1)
+            a = sorted_gaps[offset + low]
+            b = sorted_gaps[offset + high]
+            result[p] = float(a + (b - a) * (position - low))
+        return result
+
+    def _segment_stats_lists(self, segments):
+        """Sans numpy : chaque segment est traité directement sur sa liste de numéros"""
+        stats = []
+        for key, category_name, segment, start, end in segments:
+            if end - start < 2:
+                stats.append(self._empty_stat())
+                continue
+            gaps = list(map(sub, segment[1:], segment))
+            max_gap = max(gaps)
+            max_idx = gaps.index(max_gap)
+            count = len(gaps)
+            stats.append((
+                gaps,
+                max_gap,
+                (segment[max_idx], segment[max_idx + 1]),
+                (segment[-1] - segment[0]) / count,
+                self._percentiles(sorted(gaps), 0, count)
+            ))
+        return stats
+
+    def _segment_stats_numpy(self, values, segments):
+        flat = np.frombuffer(values, dtype=np.int64) if len(values) else np.zeros(0, dtype=np.int64)
+        all_gaps = np.diff(flat)
+
+        starts = np.array([s[3] for s in segments if s[4] - s[3] >= 2], dtype=np.int64)
+        ends = np.array([s[4] for s in segments if s[4] - s[3] >= 2], dtype=np.int64)
+        if len(starts) == 0:
+            return [self._empty_stat() for _ in segments]
+
+        # Écarts valides : ceux à l'intérieur d'un segment (pas entre deux segments)
+        valid = np.zeros(len(all_gaps), dtype=bool)
+        counts = ends - starts - 1
+        seg_ids = np.repeat(np.arange(len(starts)), counts)
+        positions = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+        valid[positions] = True
+
+        masked = np.where(valid, all_gaps, np.iinfo(np.int64).min)
+        max_gaps = np.maximum.reduceat(masked, starts)
+
+        # Premier indice où le max est atteint dans chaque segment
+        range_ends = np.append(starts[1:], len(masked))
+        first = starts[0]
+        hits = np.flatnonzero(masked[first:] == np.repeat(max_gaps, range_ends - starts)) + first
+        max_idx = hits[np.searchsorted(hits, starts)]
+
+        means = (flat[ends - 1] - flat[starts]) / counts
+
+        # Tri des écarts par segment, puis interpolation pour les percentiles
+        valid_gaps = all_gaps[positions]
+        sorted_gaps = valid_gaps[np.lexsort((valid_gaps, seg_ids))]
+        offsets = np.cumsum(counts) - counts
+        percentiles = {}
+        for p in self.percentiles:
+            position = (counts - 1) * p / 100
+            low = position.astype(np.int64)
+            high = np.minimum(low + 1, counts - 1)
+            a = sorted_gaps[offsets + low]
+            b = sorted_gaps[offsets + high]
+            percentiles[p] = (a + (b - a) * (position - low)).tolist()
+
+        gaps_list = valid_gaps.tolist()
+        max_gaps = max_gaps.tolist()
+        max_idx = max_idx.tolist()
+        means = means.tolist()
+        offsets = offsets.tolist()
+        counts = counts.tolist()
+
+        stats = []
+        k = 0
+        for key, category_name, numbers, start, end in segments:
+            if end - start < 2:
+                stats.append(self._empty_stat())
+                continue
+            idx = max_idx[k]
+            stats.append((
+                gaps_list[offsets[k]:offsets[k] + counts[k]],
+                max_gaps[k],
+                (values[idx], values[idx + 1]),
+                means[k],
+                {p: float(percentiles[p][k]) for p in self.percentiles}
+            ))
+            k += 1
+        return stats
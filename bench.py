@@ -0,0 +1,217 @@
+"""
+Benchmarks : parseur, analyseur, stockage et rendu des bilans
+
+    python bench.py                            # toutes les tailles → bench_results.json
+    python bench.py --sizes 60,6000 -o avant.json
+    python bench.py --compare avant.json apres.json [--threshold 0.1]
+
+Les messages sont générés par synthetic.py avec une graine fixe : deux
+exécutions mesurent exactement les mêmes entrées. --compare compare les
+médianes et sort en erreur (code 1) si une mesure régresse de plus du seuil.
+"""
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from parser import MessageParser
+from analyzer import GapAnalyzer, BatchGapEngine
+from storage import create_storage
+from bot import BotLogic
+from synthetic import STYLES, NUMBERS_PER_GAME, games_for_numbers, generate_message
+
+# De 60 jeux (un message réel) à ~100 000 numéros
+SIZES = (60, 600, 6000, games_for_numbers(100_000))
+PARSER_MODES = ('index', 'legacy')
+BACKENDS = ('json', 'journal', 'sqlite')
+# Heures déjà enregistrées dans la journée avant de mesurer save_analysis
+HISTORY_HOURS = 24
+DEFAULT_OUTPUT = 'bench_results.json'
+DEFAULT_THRESHOLD = 0.10
+DEFAULT_SEED = 1
+
+
+def measure(fn, min_time=0.2, min_runs=5, max_runs=1000):
+    """
+    Chronomètre fn() (après un appel d'échauffement, GC désactivé comme
+    timeit) : au moins min_runs appels et min_time secondes cumulées.
+    """
+    fn()
+    timings = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        while len(timings) < max_runs and (len(timings) < min_runs or sum(timings) < min_time):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return {
+        'runs': len(timings),
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0
+    }
+
+
+def _gaps_data(analysis):
+    """Format enregistré par main.process_channel_message"""
+    return {cat: {'max_gap': data['max_gap'], 'gaps': data['gaps'], 'max_gap_pair': data.get('max_gap_pair')}
+            for cat, data in analysis.items()}
+
+
+def bench_size(games, seed, min_time, workdir):
+    """Mesures pour une taille : {nom: mesure}"""
+    results = {}
+
+    def record(name, fn, **extra):
+        result = measure(fn, min_time)
+        result.update(games=games, numbers=games * NUMBERS_PER_GAME, **extra)
+        results[f"{name}@{games}"] = result
+        print(f"  {name:<28} {result['median'] * 1000:>10.3f} ms  (min {result['min'] * 1000:.3f}, "
+              f"{result['runs']} runs)", flush=True)
+
+    messages = {style: generate_message(games, style, seed) for style in STYLES}
+    for mode in PARSER_MODES:
+        parser = MessageParser(mode)
+        for style, (text, expected) in messages.items():
+            if parser.parse_message(text) != expected:
+                raise RuntimeError(f"Parsing incorrect : mode {mode}, style {style}, {games} jeux")
+            record(f"parse[{mode},{style}]", lambda: parser.parse_message(text), chars=len(text))
+
+    parsed = messages['config'][1]
+    analyzer = GapAnalyzer()
+    record("analyze[full]", lambda: analyzer.analyze_all_categories(parsed))
+
+    analysis = analyzer.analyze_all_categories(parsed)
+    gaps_data = _gaps_data(analysis)
+
+    # Recalcul d'une semaine d'historique (/tendances)
+    week = {f"Journée_2026010{day}": {'23:00': {'timestamp': f"2026-01-0{day}T23:00:00", 'gaps': gaps_data}}
+            for day in range(1, 8)}
+    engine = BatchGapEngine()
+    record("recompute[engine,7j]", lambda: engine.analyze_history(week))
+
+    hours = [f"{hour:02d}:00" for hour in range(HISTORY_HOURS)]
+    for backend in BACKENDS:
+        backend_dir = os.path.join(workdir, f"{backend}_{games}")
+        os.makedirs(backend_dir)
+        storage = create_storage(
+            backend, os.path.join(backend_dir, 'data.json'), sqlite_file=os.path.join(backend_dir, 'data.db')
+        )
+        try:
+            for hour in hours:
+                storage.save_analysis(hour, gaps_data)
+            cycle = itertools.cycle(hours)
+            record(f"save_analysis[{backend}]", lambda: storage.save_analysis(next(cycle), gaps_data))
+
+            if backend == 'json':
+                bot = BotLogic(storage)
+                record("render[bilan]", lambda: bot.format_bilan(analysis, games, '12:00'))
+                record("render[auto_send]", lambda: bot._render_auto_send_bilan(None))
+
+                def render_historique():
+                    # Rendu à froid : sans les caches de BotLogic
+                    bot._historiques.clear()
+                    bot._hour_fragments.clear()
+                    return bot.format_historique()
+                record("render[historique]", render_historique)
+        finally:
+            storage.close()
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(sizes, seed, min_time):
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    results = {}
+    try:
+        for games in sizes:
+            print(f"📊 {games} jeux (~{games * NUMBERS_PER_GAME} numéros)", flush=True)
+            results.update(bench_size(games, seed, min_time, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': seed,
+            'sizes': list(sizes),
+            'min_time': min_time
+        },
+        'results': results
+    }
+
+
+def compare(before, after, threshold):
+    """Affiche les écarts de médiane ; retourne le nombre de régressions"""
+    for key in ('python', 'platform', 'seed'):
+        if before['meta'].get(key) != after['meta'].get(key):
+            print(f"⚠️ {key} différent : {before['meta'].get(key)} → {after['meta'].get(key)}")
+
+    regressions = 0
+    for name in sorted(before['results'].keys() & after['results'].keys()):
+        old = before['results'][name]['median']
+        new = after['results'][name]['median']
+        ratio = new / old if old else float('inf')
+        if ratio > 1 + threshold:
+            flag = '❌'
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = '✅'
+        else:
+            flag = '  '
+        print(f"{flag} {name:<36} {old * 1000:>10.3f} → {new * 1000:>10.3f} ms  ({(ratio - 1) * 100:+.1f}%)")
+    for name in sorted(before['results'].keys() ^ after['results'].keys()):
+        print(f"   {name:<36} absent d'un des deux fichiers")
+    print(f"\n{regressions} régression(s) au-delà de {threshold * 100:.0f}%")
+    return regressions
+
+
+def main(argv=None):
+    args = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    args.add_argument('--sizes', help="Tailles en nombre de jeux, séparées par des virgules")
+    args.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    args.add_argument('--min-time', type=float, default=0.2, help="Durée minimale par mesure (s)")
+    args.add_argument('-o', '--output', default=DEFAULT_OUTPUT)
+    args.add_argument('--compare', nargs=2, metavar=('AVANT', 'APRES'))
+    args.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    options = args.parse_args(argv)
+
+    if options.compare:
+        with open(options.compare[0], encoding='utf-8') as f:
+            before = json.load(f)
+        with open(options.compare[1], encoding='utf-8') as f:
+            after = json.load(f)
+        return 1 if compare(before, after, options.threshold) else 0
+
+    sizes = [int(size) for size in options.sizes.split(',')] if options.sizes else SIZES
+    report = run(sizes, options.seed, options.min_time)
+    with open(options.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Résultats : {options.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
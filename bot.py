@@ -1,12 +1,29 @@
 """
 Logique du bot et formatage des messages
 """
-from datetime import datetime
+from datetime import datetime, timedelta
+from analyzer import BatchGapEngine
 from config import CATEGORIES, get_current_journee, get_channels_info
 
 class BotLogic:
-    def __init__(self, storage):
+    def __init__(self, storage, label=None):
         self.storage = storage
+        # Nom de la source affiché dans les bilans (plusieurs sources suivies)
+        self.label = label
+        # Cache des rendus : bilan auto par filtre de catégories (valide tant
+        # que data_version et la journée n'ont pas changé), fragments
+        # d'historique par heure et historique complet de la journée
+        self._auto_bilans = {}
+        self._auto_bilans_version = None
+        self._hour_fragments = {}
+        self._historiques = {}
+        self._engine = BatchGapEngine()
+        storage.add_listener(self._invalidate)
+    
+    def _invalidate(self, journee, hour):
+        """Appelé par le stockage quand une heure est (ré)enregistrée"""
+        self._hour_fragments.get(journee, {}).pop(hour, None)
+        self._historiques.pop(journee, None)
     
     def format_statut(self, source, dest):
         """Formate le message de statut"""
@@ -23,15 +40,19 @@ class BotLogic:
 📅 **Journée:** {get_current_journee().replace('_', ' ')}
 🕐 **Heure actuelle:** {datetime.now().strftime('%H:%M:%S')}"""
     
-    def format_bilan(self, analysis, total_games, hour_str, comparison=None):
-        """Formate le bilan des écarts"""
+    def format_bilan(self, analysis, total_games, hour_str, comparison=None, categories=None):
+        """Formate le bilan des écarts (categories : catégories à inclure, None = toutes)"""
         lines = [
             "🌸 BILAN DES ÉCARTS 🌸",
             f"⏰ {hour_str} | 🎲 {total_games} jeux",
             ""
         ]
+        if self.label:
+            lines.insert(1, f"🎰 {self.label}")
 
         for category_name, data in analysis.items():
+            if categories is not None and category_name not in categories:
+                continue
             emoji = data['emoji']
             max_gap = data['max_gap']
             alert = ""
@@ -47,37 +68,102 @@ class BotLogic:
     def format_historique(self):
         """Formate l'historique de la journée"""
         journee = get_current_journee()
+        cached = self._historiques.get(journee)
+        if cached is not None:
+            return cached
+        
         historique = self.storage.get_historique(journee)
         
         lines = [
             f"📚 **Historique - {journee.replace('_', ' ')}**",
             ""
         ]
+        if self.label:
+            lines.insert(1, f"🎰 {self.label}")
         
         if not historique:
             lines.append("Aucune analyse enregistrée aujourd'hui.")
-            return "\n".join(lines)
+            text = "\n".join(lines)
+            self._historiques = {journee: text}
+            return text
+        
+        if journee not in self._hour_fragments:
+            # Nouvelle journée : les fragments des journées passées ne servent plus
+            self._hour_fragments = {journee: {}}
+        fragments = self._hour_fragments[journee]
         
         for hour in sorted(historique.keys()):
-            data = historique[hour]
-            gaps = data.get('gaps', {})
-            total_categories = len(gaps)
-            lines.append(f"🕐 **{hour}** — {total_categories} catégories")
-            for cat_name, cat_data in gaps.items():
-                emoji = CATEGORIES.get(cat_name, {}).get('emoji', '⚪')
-                max_gap = cat_data.get('max_gap', 0)
-                pair = cat_data.get('max_gap_pair')
-                if pair and len(pair) == 2:
-                    pair_str = f" (#N{pair[0]} → #N{pair[1]})"
-                else:
-                    pair_str = ""
-                lines.append(f"  {emoji} {cat_name} : {max_gap}{pair_str}")
-            lines.append("")
+            fragment = fragments.get(hour)
+            if fragment is None:
+                fragment = self._format_hour_fragment(hour, historique[hour])
+                fragments[hour] = fragment
+            lines.append(fragment)
         
+        text = "\n".join(lines)
+        self._historiques = {journee: text}
+        return text
+    
+    def _format_hour_fragment(self, hour, data):
+        """Lignes de l'historique pour une heure (suivies d'une ligne vide)"""
+        gaps = data.get('gaps', {})
+        total_categories = len(gaps)
+        lines = [f"🕐 **{hour}** — {total_categories} catégories"]
+        for cat_name, cat_data in gaps.items():
+            emoji = CATEGORIES.get(cat_name, {}).get('emoji', '⚪')
+            max_gap = cat_data.get('max_gap', 0)
+            pair = cat_data.get('max_gap_pair')
+            if pair and len(pair) == 2:
+                pair_str = f" (#N{pair[0]} → #N{pair[1]})"
+            else:
+                pair_str = ""
+            lines.append(f"  {emoji} {cat_name} : {max_gap}{pair_str}")
+        lines.append("")
         return "\n".join(lines)
     
-    def format_auto_send_bilan(self):
+    def format_tendances(self, days):
+        """Statistiques des `days` dernières journées, recalculées sur l'historique enregistré"""
+        end = get_current_journee()
+        start_date = datetime.strptime(end.split('_', 1)[1], '%Y%m%d') - timedelta(days=days - 1)
+        historique = self.storage.get_historique_range(f"Journée_{start_date.strftime('%Y%m%d')}", end)
+
+        lines = [
+            f"📈 **Tendances - {days} journée{'s' if days > 1 else ''}**",
+            ""
+        ]
+        if self.label:
+            lines.insert(1, f"🎰 {self.label}")
+
+        if not historique:
+            lines.append("Aucune analyse enregistrée sur la période.")
+            return "\n".join(lines)
+
+        percentile_keys = self._engine.percentiles
+        for journee, results in self._engine.analyze_history(historique).items():
+            lines.append(f"📅 **{journee.replace('_', ' ')}**")
+            for cat_name, data in results.items():
+                if data['count'] < 2:
+                    continue
+                percentiles = " ".join(f"p{p} {data['percentiles'][p]:g}" for p in percentile_keys)
+                lines.append(
+                    f"  {data['emoji']} {cat_name} : {data['max_gap']} | moy {data['mean_gap']:.1f} | {percentiles}"
+                )
+            lines.append("")
+
+        return "\n".join(lines)
+
+    def format_auto_send_bilan(self, categories=None):
         """Formate le bilan pour l'envoi automatique (utilise dernières données connues)"""
+        version = (self.storage.data_version, get_current_journee())
+        if version != self._auto_bilans_version:
+            self._auto_bilans = {}
+            self._auto_bilans_version = version
+        
+        key = tuple(sorted(categories)) if categories is not None else None
+        if key not in self._auto_bilans:
+            self._auto_bilans[key] = self._render_auto_send_bilan(categories)
+        return self._auto_bilans[key]
+    
+    def _render_auto_send_bilan(self, categories):
         last_data = self.storage.get_last_parsed_data()
         
         if not last_data:
@@ -101,7 +187,7 @@ class BotLogic:
         
         hour_str = datetime.fromisoformat(timestamp).strftime('%H:%M') if isinstance(timestamp, str) else datetime.now().strftime('%H:%M')
         
-        return self.format_bilan(analysis, total_games, hour_str)
+        return self.format_bilan(analysis, total_games, hour_str, categories=categories)
     
     def format_interval_update(self, new_interval):
         """Confirme la mise à jour de l'intervalle"""
@@ -109,7 +195,7 @@ class BotLogic:
 
 ⏱️ Nouvel intervalle d'envoi: **{new_interval} minutes**
 
-Le bilan sera envoyé automatiquement toutes les {new_interval} minutes au canal destinataire."""
+Le bilan sera envoyé automatiquement toutes les {new_interval} minutes aux canaux destinataires (sauf intervalle propre)."""
     
     def format_auto_send_status(self, enabled):
         """Confirme l'activation/désactivation de l'envoi auto"""
@@ -0,0 +1,121 @@
+"""
+Statut du bot dans les canaux : vérifications parallèles, cache à durée de vie
+"""
+import asyncio
+import time
+from datetime import datetime
+from config import CHANNEL_CHECK_TTL
+from log import get_logger
+
+logger = get_logger('channels')
+
+MEMBER_STATUSES = ('administrator', 'member', 'creator')
+
+
+def describe_error(error):
+    """Message lisible pour une erreur de get_chat_member"""
+    error_msg = str(error)
+    lowered = error_msg.lower()
+    if "chat not found" in lowered:
+        return "Canal non trouvé (ID invalide ou bot non membre)"
+    if "user not participant" in lowered:
+        return "Bot non membre du canal"
+    if "forbidden" in lowered:
+        return "Bot sans permission d'accès"
+    return f"Erreur: {error_msg}"
+
+
+class ChannelStatusCache:
+    """
+    Appartenance du bot à chaque canal configuré, gardée en mémoire :
+    - identité du bot (get_me) demandée une seule fois
+    - un seul appel par canal (get_chat_member), tous les canaux en parallèle
+    - un résultat reste valable ttl secondes ; run() rafraîchit en tâche de
+      fond avant expiration, les lecteurs (/health, /, /verifier) ne font
+      donc pas d'appel réseau
+    channels : [(rôle, id, chat_id)], ex. ('source', 'principal', -100...)
+    """
+
+    def __init__(self, channels, ttl=CHANNEL_CHECK_TTL):
+        # Un canal à la fois source et destination n'est vérifié qu'une fois
+        self.channels = []
+        seen = set()
+        for channel in channels:
+            if channel[2] not in seen:
+                seen.add(channel[2])
+                self.channels.append(channel)
+        self.ttl = ttl
+        self.last_check = None
+        self._bot_id = None
+        self._results = {}
+        self._checked_at = {}
+        self._lock = asyncio.Lock()
+
+    async def _check(self, bot, bot_id, role, channel_id, chat_id):
+        try:
+            if bot_id is None:
+                raise RuntimeError("identité du bot inconnue (getMe)")
+            member = await bot.get_chat_member(chat_id, bot_id)
+            result = {'ok': True, 'member': member.status in MEMBER_STATUSES, 'error': None}
+        except Exception as e:
+            result = {'ok': False, 'member': False, 'error': describe_error(e)}
+        if result['ok']:
+            logger.info("%s %s: %s", role, chat_id, '✅' if result['member'] else '❌')
+        else:
+            logger.warning("%s %s: ❌ (%s)", role, chat_id, result['error'])
+        result.update(role=role, id=channel_id, chat_id=chat_id, checked_at=datetime.now().isoformat())
+        return result
+
+    def _older_than(self, chat_id, max_age, now):
+        checked_at = self._checked_at.get(chat_id)
+        return checked_at is None or now - checked_at >= max_age
+
+    async def refresh(self, bot, max_age=None):
+        """
+        Revérifie, en parallèle, les canaux vérifiés il y a plus de max_age
+        secondes (None = ttl, 0 = tous) et retourne results().
+        Les appels simultanés sont sérialisés : le second trouve les
+        résultats du premier déjà à jour et ne refait pas les appels.
+        """
+        if max_age is None:
+            max_age = self.ttl
+        async with self._lock:
+            now = time.monotonic()
+            stale = [channel for channel in self.channels if self._older_than(channel[2], max_age, now)]
+            if stale:
+                if self._bot_id is None:
+                    try:
+                        self._bot_id = (await bot.get_me()).id
+                    except Exception as e:
+                        logger.warning("⚠️ getMe impossible: %s", e)
+                results = await asyncio.gather(*(self._check(bot, self._bot_id, *channel) for channel in stale))
+                now = time.monotonic()
+                for result in results:
+                    self._results[result['chat_id']] = result
+                    self._checked_at[result['chat_id']] = now
+                self.last_check = datetime.now().isoformat()
+        return self.results()
+
+    async def run(self, bot):
+        """Tâche de fond : rafraîchit à mi-vie pour que le cache ne soit jamais expiré"""
+        logger.info("🔍 Vérification du statut des canaux...")
+        interval = max(1.0, self.ttl / 2)
+        while True:
+            try:
+                await self.refresh(bot, max_age=interval)
+            except Exception as e:
+                logger.warning("⚠️ Impossible de vérifier les canaux: %s", e)
+            await asyncio.sleep(interval)
+
+    def get(self, chat_id):
+        """Dernier résultat pour un canal (None = jamais vérifié)"""
+        return self._results.get(chat_id)
+
+    def is_member(self, chat_id):
+        """True / False, None si jamais vérifié"""
+        result = self._results.get(chat_id)
+        return None if result is None else result['member']
+
+    def results(self):
+        """Résultats dans l'ordre de configuration (canaux jamais vérifiés exclus)"""
+        return [self._results[chat_id] for _, _, chat_id in self.channels if chat_id in self._results]
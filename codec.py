@@ -0,0 +1,125 @@
+"""
+Encodage compact des listes d'écarts sur disque
+"""
+import base64
+
+# Premier octet du blob : format des valeurs qui suivent
+_RAW_BYTES = 0   # toutes les valeurs dans [0, 127] : un octet par valeur
+_VARINT = 1      # varints zigzag (valeurs quelconques)
+
+
+def pack_ints(values):
+    """Liste d'entiers → blob base64 (varints zigzag, ou octets bruts si petites valeurs)"""
+    if not values:
+        return ''
+    if min(values) >= 0 and max(values) < 128:
+        raw = bytes([_RAW_BYTES]) + bytes(values)
+    else:
+        out = bytearray([_VARINT])
+        for value in values:
+            value = (value << 1) ^ (value >> 63)
+            while value >= 0x80:
+                out.append((value & 0x7F) | 0x80)
+                value >>= 7
+            out.append(value)
+        raw = bytes(out)
+    return base64.b64encode(raw).decode('ascii')
+
+
+def unpack_ints(blob):
+    """Blob base64 → liste d'entiers"""
+    if not blob:
+        return []
+    raw = base64.b64decode(blob)
+    if raw[0] == _RAW_BYTES:
+        return list(raw[1:])
+    values = []
+    value = 0
+    shift = 0
+    for byte in raw[1:]:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append((value >> 1) ^ -(value & 1))
+        value = 0
+        shift = 0
+    return values
+
+
+def encode_gaps(gaps, previous=None, previous_hour=None):
+    """
+    Encode une liste d'écarts. Si la liste de l'heure précédente en est un
+    préfixe (messages cumulatifs), seule la suite est stockée avec une
+    référence à cette heure.
+    """
+    # tuple() : les écarts peuvent être des listes (JSON) ou des tuples (analyseur)
+    if previous and len(previous) <= len(gaps) and tuple(gaps[:len(previous)]) == tuple(previous):
+        return {'ref': previous_hour, 'z': pack_ints(gaps[len(previous):])}
+    return {'z': pack_ints(gaps)}
+
+
+def decode_gaps(encoded):
+    """Décode une liste d'écarts sans référence (les listes JSON brutes sont acceptées telles quelles)"""
+    if isinstance(encoded, list):
+        return encoded
+    return unpack_ints(encoded.get('z', ''))
+
+
+def encode_gaps_data(gaps_data):
+    """Encode {catégorie: {'gaps', ...}} sans référence à une autre heure"""
+    return {
+        category: {**data, 'gaps': encode_gaps(data.get('gaps', []))}
+        for category, data in gaps_data.items()
+    }
+
+
+def decode_gaps_data(gaps_data):
+    """Inverse de encode_gaps_data"""
+    return {
+        category: {**data, 'gaps': decode_gaps(data.get('gaps', []))}
+        for category, data in gaps_data.items()
+    }
+
+
+def encode_day(day):
+    """
+    Encode une journée {heure: {'timestamp', 'gaps': {catégorie: {...}}}}
+    en partageant avec l'heure précédente le préfixe commun des écarts
+    """
+    encoded = {}
+    previous_hour = None
+    previous_gaps = {}
+    for hour in sorted(day):
+        hour_data = day[hour]
+        categories = {}
+        for category, data in hour_data.get('gaps', {}).items():
+            gaps = data.get('gaps', [])
+            categories[category] = {
+                **data,
+                'gaps': encode_gaps(gaps, previous_gaps.get(category), previous_hour)
+            }
+        encoded[hour] = {**hour_data, 'gaps': categories}
+        previous_hour = hour
+        previous_gaps = {category: data.get('gaps', []) for category, data in hour_data.get('gaps', {}).items()}
+    return encoded
+
+
+def decode_day(day):
+    """Inverse de encode_day"""
+    decoded = {}
+    resolved = {}
+    for hour in sorted(day):
+        hour_data = day[hour]
+        categories = {}
+        for category, data in hour_data.get('gaps', {}).items():
+            encoded = data.get('gaps', [])
+            if isinstance(encoded, dict) and encoded.get('ref') is not None:
+                base = resolved.get(encoded['ref'], {}).get(category, [])
+                gaps = base + unpack_ints(encoded.get('z', ''))
+            else:
+                gaps = decode_gaps(encoded)
+            categories[category] = {**data, 'gaps': gaps}
+        decoded[hour] = {**hour_data, 'gaps': categories}
+        resolved[hour] = {category: data['gaps'] for category, data in categories.items()}
+    return decoded
@@ -2,6 +2,7 @@
 Configuration du Bot Telegram d'Analyse d'Écarts
 """
 import os
+import json
 from datetime import datetime
 
 # ==========================================
@@ -10,7 +11,10 @@ from datetime import datetime
 
 API_ID = 29177661
 API_HASH = "a8639172fa8d35dbfd8ea46286d349ab"
-BOT_TOKEN = "7815360317:AAGsrFzeUZrHOjujf5aY2UjlBj4GOblHSig"
+BOT_TOKEN = os.getenv('BOT_TOKEN', "7815360317:AAGsrFzeUZrHOjujf5aY2UjlBj4GOblHSig")
+# URL de l'API Bot, le token est ajouté à la fin (faux serveur local de
+# fake_telegram.py pour les tests de charge)
+TELEGRAM_BASE_URL = os.getenv('TELEGRAM_BASE_URL', 'https://api.telegram.org/bot')
 
 # ==========================================
 # CONFIGURATION DES CANAUX (OBLIGATOIRE)
@@ -19,6 +23,45 @@ BOT_TOKEN = "7815360317:AAGsrFzeUZrHOjujf5aY2UjlBj4GOblHSig"
 SOURCE_CHANNEL_ID = -1003309666471
 DESTINATION_CHANNEL_ID = -1003725380926
 
+# Canaux source (tables de jeu suivies). Chaque entrée :
+#   'id'          : identifiant interne, suffixe des fichiers de données
+#                   (la première source garde DATA_FILE / SQLITE_FILE)
+#   'chat_id'     : canal Telegram
+#   'label'       : nom affiché dans les bilans (None = id)
+#   'categories'  : catégories à extraire (None = toutes)
+#   'parser_mode' : 'index' ou 'legacy' (None = PARSER_MODE)
+# Surchargeable par la variable d'environnement SOURCES (liste JSON)
+SOURCES = [
+    {
+        'id': 'principal',
+        'chat_id': SOURCE_CHANNEL_ID,
+        'label': None,
+        'categories': None,
+        'parser_mode': None
+    }
+]
+if os.getenv('SOURCES'):
+    SOURCES = json.loads(os.getenv('SOURCES'))
+
+# Canaux de destination des bilans. Chaque entrée :
+#   'id'               : identifiant interne (statistiques, dernier envoi)
+#   'chat_id'          : canal Telegram
+#   'categories'       : catégories à inclure (None = toutes)
+#   'interval_minutes' : intervalle d'envoi auto propre (None = /intervalle)
+#   'sources'          : sources dont on reçoit les bilans (None = toutes)
+# Surchargeable par la variable d'environnement DESTINATIONS (liste JSON)
+DESTINATIONS = [
+    {
+        'id': 'destination',
+        'chat_id': DESTINATION_CHANNEL_ID,
+        'categories': None,
+        'interval_minutes': None,
+        'sources': None
+    }
+]
+if os.getenv('DESTINATIONS'):
+    DESTINATIONS = json.loads(os.getenv('DESTINATIONS'))
+
 # ==========================================
 # CONFIGURATION ADMINISTRATEUR
 # ==========================================
@@ -32,8 +75,26 @@ ADMIN_USER_IDS = [ADMIN_ID]
 
 PORT = int(os.getenv('PORT', 10000))
 HOST = '0.0.0.0'
+# Durée de validité (s) du statut du bot dans les canaux, rafraîchi en tâche de fond
+CHANNEL_CHECK_TTL = int(os.getenv('CHANNEL_CHECK_TTL', 300))
 DATA_FILE = 'ecarts_data.json'
 
+# 'json'    : réécriture complète du fichier à chaque modification
+# 'journal' : journal en ajout seul + compaction périodique
+# 'sqlite'  : base SQLite (SQLITE_FILE)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'json')
+JOURNAL_COMPACT_EVERY = int(os.getenv('JOURNAL_COMPACT_EVERY', 500))
+SQLITE_FILE = os.getenv('SQLITE_FILE', 'ecarts_data.db')
+# Écriture différée (json/journal) : délai max en secondes avant écriture
+# des modifications regroupées (0 = écriture immédiate)
+WRITE_BEHIND_DELAY = float(os.getenv('WRITE_BEHIND_DELAY', 0))
+# Historique partitionné (json/journal) : un fichier par journée dans ce
+# dossier, chargé à la demande ('' = tout l'historique dans DATA_FILE)
+HISTORY_DIR = os.getenv('HISTORY_DIR', '')
+HISTORY_MEMORY_BUDGET_MB = int(os.getenv('HISTORY_MEMORY_BUDGET_MB', 16))
+# /tendances : nombre max de journées recalculées (et affichées) d'un coup
+TENDANCES_MAX_DAYS = int(os.getenv('TENDANCES_MAX_DAYS', 7))
+
 # ==========================================
 # CONFIGURATION INTERVALLES
 # ==========================================
@@ -41,6 +102,78 @@ DATA_FILE = 'ecarts_data.json'
 DEFAULT_INTERVAL_MINUTES = int(os.getenv('DEFAULT_INTERVAL', 30))
 MIN_INTERVAL_MINUTES = 5
 MAX_INTERVAL_MINUTES = 1440
+# Délai avant nouvel essai après un envoi automatique échoué
+SCHEDULER_RETRY_SECONDS = int(os.getenv('SCHEDULER_RETRY_SECONDS', 60))
+
+# ==========================================
+# CONFIGURATION PARSEUR
+# ==========================================
+
+# 'index'  : un seul passage sur le message (index des sections)
+# 'legacy' : re-scan du message pour chaque catégorie
+PARSER_MODE = os.getenv('PARSER_MODE', 'index')
+
+# Cache des messages déjà traités (empreinte du texte → résultat)
+MESSAGE_CACHE_SIZE = int(os.getenv('MESSAGE_CACHE_SIZE', 64))
+# Durée de vie d'une entrée en secondes (0 = pas d'expiration)
+MESSAGE_CACHE_TTL = int(os.getenv('MESSAGE_CACHE_TTL', 0))
+
+# Exécution du parsing/analyse : 'inline' (boucle asyncio), 'thread' ou 'process'
+WORKER_MODE = os.getenv('WORKER_MODE', 'thread')
+WORKER_COUNT = int(os.getenv('WORKER_COUNT', 2))
+MAX_INFLIGHT_JOBS = int(os.getenv('MAX_INFLIGHT_JOBS', 4))
+
+# File d'ingestion : nombre max d'heures distinctes en attente (au-delà, la
+# plus ancienne est évincée). Les clés sont les heures "HH:00" : plus de 24
+# n'a aucun effet ; 4 heures en attente = traitement bloqué depuis des heures
+INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', 4))
+
+# ==========================================
+# CONFIGURATION LOGS
+# ==========================================
+
+# Niveau minimal : DEBUG, INFO, WARNING, ERROR
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# 'text' (lisible) ou 'json' (une ligne JSON par événement)
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+
+# Traces par message (une ligne JSON par trace, fichier tournant ; '' = désactivé)
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+# Part des traces écrites (0 à 1, 1 = traçage complet, à activer
+# explicitement) ; les traces en erreur ou plus lentes que TRACE_SLOW_MS
+# sont toujours écrites
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', 0.01))
+TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS', 5000))
+TRACE_MAX_BYTES = int(os.getenv('TRACE_MAX_BYTES', 5 * 1024 * 1024))
+TRACE_BACKUP_COUNT = int(os.getenv('TRACE_BACKUP_COUNT', 3))
+
+# Profilage (cProfile + tracemalloc) dès le démarrage, sur PROFILE_MESSAGES
+# messages et/ou PROFILE_SECONDS secondes (0 = désactivé ; voir /profil)
+PROFILE_MESSAGES = int(os.getenv('PROFILE_MESSAGES', 0))
+PROFILE_SECONDS = int(os.getenv('PROFILE_SECONDS', 0))
+# Dossier des fichiers .pstats et .snapshot, taille des résumés
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_TOP_N = int(os.getenv('PROFILE_TOP_N', 10))
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv('PROFILE_TRACEMALLOC_FRAMES', 1))
+
+# ==========================================
+# CONFIGURATION ENVOI
+# ==========================================
+
+# Envois simultanés vers l'API Telegram
+SEND_WORKERS = int(os.getenv('SEND_WORKERS', 4))
+# Débit par chat (messages/seconde) et rafale autorisée ; Telegram limite
+# les canaux et groupes à environ 20 messages par minute
+SEND_PER_CHAT_RATE = float(os.getenv('SEND_PER_CHAT_RATE', 20 / 60))
+SEND_PER_CHAT_BURST = int(os.getenv('SEND_PER_CHAT_BURST', 3))
+# Débit global du bot (messages/seconde)
+SEND_GLOBAL_RATE = float(os.getenv('SEND_GLOBAL_RATE', 30))
+# Nouveaux essais sur erreur réseau / RetryAfter, attente exponentielle (secondes)
+SEND_MAX_RETRIES = int(os.getenv('SEND_MAX_RETRIES', 5))
+SEND_BACKOFF_BASE = float(os.getenv('SEND_BACKOFF_BASE', 1))
+SEND_BACKOFF_MAX = float(os.getenv('SEND_BACKOFF_MAX', 60))
+# Connexions HTTP partagées par tous les envois (pool du bot)
+SEND_POOL_SIZE = int(os.getenv('SEND_POOL_SIZE', 32))
 
 # ==========================================
 # CATÉGORIES À ANALYSER (ADAPTÉ AU FORMAT RÉEL)
@@ -107,7 +240,9 @@ def get_channels_info():
     """Retourne les informations des canaux configurés"""
     return {
         'source': SOURCE_CHANNEL_ID,
+        'sources': [src['chat_id'] for src in SOURCES],
         'destination': DESTINATION_CHANNEL_ID,
+        'destinations': [dest['chat_id'] for dest in DESTINATIONS],
         'source_str': str(SOURCE_CHANNEL_ID),
         'destination_str': str(DESTINATION_CHANNEL_ID)
     }
@@ -130,6 +265,31 @@ def validate_configuration():
     if not str(DESTINATION_CHANNEL_ID).startswith('-100'):
         errors.append(f"❌ DESTINATION_CHANNEL_ID invalide: {DESTINATION_CHANNEL_ID}")
     
+    source_ids = [src.get('id') for src in SOURCES]
+    if len(set(source_ids)) != len(source_ids):
+        errors.append("❌ SOURCES: identifiants en double")
+    for src in SOURCES:
+        if not str(src.get('chat_id')).startswith('-100'):
+            errors.append(f"❌ Source '{src.get('id')}' invalide: {src.get('chat_id')}")
+        for category in src.get('categories') or []:
+            if category not in CATEGORIES:
+                errors.append(f"❌ Source '{src.get('id')}': catégorie inconnue '{category}'")
+    
+    for dest in DESTINATIONS:
+        if not str(dest.get('chat_id')).startswith('-100'):
+            errors.append(f"❌ Destination '{dest.get('id')}' invalide: {dest.get('chat_id')}")
+        for category in dest.get('categories') or []:
+            if category not in CATEGORIES:
+                warnings.append(f"⚠️ Destination '{dest.get('id')}': catégorie inconnue '{category}'")
+        for source_id in dest.get('sources') or []:
+            if source_id not in source_ids:
+                warnings.append(f"⚠️ Destination '{dest.get('id')}': source inconnue '{source_id}'")
+    
+    if INGEST_QUEUE_SIZE < 1:
+        errors.append(f"❌ INGEST_QUEUE_SIZE invalide: {INGEST_QUEUE_SIZE} (minimum 1)")
+    elif INGEST_QUEUE_SIZE > 24:
+        warnings.append(f"⚠️ INGEST_QUEUE_SIZE={INGEST_QUEUE_SIZE}: au plus 24 heures distinctes en attente, limite sans effet")
+    
     if ADMIN_ID == 0:
         warnings.append("⚠️ ADMIN_ID non configuré")
     
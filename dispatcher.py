@@ -0,0 +1,211 @@
+"""
+Envoi des messages Telegram : file à priorités, limites de débit et reprises
+"""
+import asyncio
+import itertools
+import random
+import time
+from telegram.error import RetryAfter, BadRequest, Forbidden, NetworkError
+from metrics import SEND_SECONDS, SENDS
+
+PRIORITY_HIGH = 0     # bilan d'un nouveau message source
+PRIORITY_NORMAL = 1   # envoi automatique / forcé
+PRIORITY_LOW = 2      # messages de test
+
+
+class TokenBucket:
+    """Seau à jetons : `rate` jetons par seconde, au plus `capacity` en réserve"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        """Secondes d'attente avant qu'un jeton soit disponible (0 = tout de suite)"""
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def block(self, seconds):
+        """Bloque le seau (RetryAfter reçu de Telegram)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class DispatcherStopped(Exception):
+    """Envoi abandonné : le dispatcher a été arrêté avant l'envoi"""
+
+
+class OutboundDispatcher:
+    """
+    Tous les envois passent par une file à priorités consommée par
+    `workers` tâches (limite de concurrence). Chaque envoi attend un jeton
+    du seau global et du seau de son chat. En cas d'erreur réseau, nouvel
+    essai avec attente exponentielle ; un RetryAfter bloque le chat pendant
+    la durée demandée par Telegram. BadRequest/Forbidden ne sont pas
+    réessayés. send() attend le résultat et relève l'erreur finale ;
+    à l'arrêt (stop), les envois pas encore faits échouent avec
+    DispatcherStopped.
+    """
+
+    def __init__(self, workers=4, per_chat_rate=1 / 3, per_chat_burst=3, global_rate=30,
+                 max_retries=5, backoff_base=1.0, backoff_max=60.0):
+        self.workers = workers
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.bot = None
+        self._queue = None
+        self._tasks = []
+        # Envois pas encore terminés et reprises programmées (call_later)
+        self._futures = set()
+        self._timers = set()
+        self._counter = itertools.count()
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets = {}
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.rate_limited = 0
+
+    def start(self, bot):
+        self.bot = bot
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Arrête les workers ; les envois en file ou en attente de reprise échouent"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for timer in self._timers:
+            timer.cancel()
+        self._timers.clear()
+        if self._queue is not None:
+            while not self._queue.empty():
+                self._queue.get_nowait()
+        for future in list(self._futures):
+            if not future.done():
+                future.set_exception(DispatcherStopped("dispatcher arrêté"))
+        self._futures.clear()
+
+    async def send(self, chat_id, text, parse_mode='Markdown', priority=PRIORITY_NORMAL):
+        """Met un message en file et attend son envoi effectif"""
+        if not self._tasks:
+            raise DispatcherStopped("dispatcher non démarré")
+        future = asyncio.get_running_loop().create_future()
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+        job = {
+            'chat_id': chat_id,
+            'text': text,
+            'parse_mode': parse_mode,
+            'attempts': 0,
+            'future': future
+        }
+        self._queue.put_nowait((priority, next(self._counter), job))
+        return await future
+
+    def _bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _requeue(self, entry, delay):
+        timer = None
+
+        def put():
+            self._timers.discard(timer)
+            self._queue.put_nowait(entry)
+
+        timer = asyncio.get_running_loop().call_later(delay, put)
+        self._timers.add(timer)
+
+    async def _worker(self):
+        while True:
+            priority, seq, job = await self._queue.get()
+            if job['future'].done():
+                continue
+
+            chat_bucket = self._bucket(job['chat_id'])
+            wait = max(chat_bucket.delay(), self._global_bucket.delay())
+            if wait > 0:
+                # Pas de jeton : on remet le message en file sans bloquer le worker
+                self._requeue((priority, seq, job), wait)
+                continue
+            chat_bucket.take()
+            self._global_bucket.take()
+
+            start = time.perf_counter()
+            try:
+                message = await self.bot.send_message(
+                    chat_id=job['chat_id'], text=job['text'], parse_mode=job['parse_mode']
+                )
+            except RetryAfter as e:
+                self._observe('rate_limited', start)
+                retry_after = e.retry_after
+                seconds = retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after)
+                chat_bucket.block(seconds)
+                self.rate_limited += 1
+                self._retry_or_fail((priority, seq, job), e, seconds)
+            except (BadRequest, Forbidden) as e:
+                self._observe('rejected', start)
+                self._fail(job, e)
+            except NetworkError as e:
+                self._observe('network_error', start)
+                delay = min(self.backoff_max, self.backoff_base * (2 ** job['attempts']))
+                self._retry_or_fail((priority, seq, job), e, delay * (0.5 + random.random() / 2))
+            except Exception as e:
+                self._observe('error', start)
+                self._fail(job, e)
+            else:
+                self._observe('ok', start)
+                self.sent += 1
+                if not job['future'].done():
+                    job['future'].set_result(message)
+
+    def _observe(self, result, start):
+        SEND_SECONDS.observe(time.perf_counter() - start, result=result)
+        SENDS.inc(result=result)
+
+    def _retry_or_fail(self, entry, error, delay):
+        job = entry[2]
+        job['attempts'] += 1
+        if job['attempts'] > self.max_retries:
+            self._fail(job, error)
+            return
+        self.retried += 1
+        self._requeue(entry, delay)
+
+    def _fail(self, job, error):
+        self.failed += 1
+        if not job['future'].done():
+            job['future'].set_exception(error)
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize() if self._queue else 0,
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried,
+            'rate_limited': self.rate_limited
+        }
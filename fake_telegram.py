@@ -0,0 +1,280 @@
+"""
+Faux serveur de l'API Bot Telegram, local et sans réseau (tests de charge)
+
+Méthodes : getMe, deleteWebhook, getUpdates (long polling), sendMessage,
+getChat, getChatMember. Les posts de canal sont injectés par
+post_to_channel() ou POST /_inject ; les messages envoyés par le bot sont
+enregistrés (GET /_sent, GET /_stats).
+
+    python fake_telegram.py --port 8081
+    TELEGRAM_BASE_URL=http://127.0.0.1:8081/bot python main.py
+"""
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+BOT_USER = {
+    'id': 7000000001,
+    'is_bot': True,
+    'first_name': 'Bot de test',
+    'username': 'ecarts_test_bot',
+    'can_join_groups': False,
+    'can_read_all_group_messages': False,
+    'supports_inline_queries': False
+}
+
+# Droits renvoyés par getChatMember : le bot est administrateur partout
+_ADMIN_RIGHTS = {
+    'can_be_edited': False,
+    'is_anonymous': False,
+    'can_manage_chat': True,
+    'can_delete_messages': True,
+    'can_manage_video_chats': True,
+    'can_restrict_members': True,
+    'can_promote_members': False,
+    'can_change_info': True,
+    'can_invite_users': True,
+    'can_post_messages': True,
+    'can_edit_messages': True,
+    'can_post_stories': True,
+    'can_edit_stories': True,
+    'can_delete_stories': True
+}
+
+
+class FakeTelegramServer:
+    """
+    État du faux serveur : file des updates, messages envoyés, compteurs.
+    send_latency : délai (s) avant chaque réponse sendMessage
+    flood_limit  : messages/s par chat au-delà desquels sendMessage répond
+                   429 (retry_after 1 s) ; 0 = illimité
+    reject_chats : chats pour lesquels sendMessage répond 400 (chat not found)
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, send_latency=0.0, flood_limit=0, reject_chats=()):
+        self.send_latency = send_latency
+        self.flood_limit = flood_limit
+        self.reject_chats = set(reject_chats)
+        self.sent = []
+        self.calls = {}
+        self.flood_errors = 0
+        self.polling = threading.Event()
+        self._closed = False
+        self._updates = deque()
+        self._next_update_id = 1
+        self._next_message_id = {}
+        self._recent_sends = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """À passer en TELEGRAM_BASE_URL (le token est ajouté à la fin)"""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='fake-telegram', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._changed:
+            self._closed = True
+            self._changed.notify_all()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    # ============ INJECTION / OBSERVATION ============
+
+    def post_to_channel(self, chat_id, text, title=None):
+        """Ajoute un post de canal aux updates ; retourne son update_id"""
+        with self._changed:
+            update_id = self._next_update_id
+            self._next_update_id += 1
+            self._updates.append({
+                'update_id': update_id,
+                'channel_post': self._message(chat_id, text, title)
+            })
+            self._changed.notify_all()
+        return update_id
+
+    def sent_since(self, index=0):
+        with self._lock:
+            return self.sent[index:]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': dict(self.calls),
+                'sent': len(self.sent),
+                'pending_updates': len(self._updates),
+                'flood_errors': self.flood_errors
+            }
+
+    # ============ MÉTHODES DE L'API ============
+
+    def _message(self, chat_id, text, title=None):
+        message_id = self._next_message_id.get(chat_id, 0) + 1
+        self._next_message_id[chat_id] = message_id
+        return {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'channel', 'title': title or f"Canal {chat_id}"},
+            'text': text
+        }
+
+    def call(self, method, params):
+        """Retourne (code HTTP, réponse JSON de l'API)"""
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        handler = getattr(self, f"_api_{method}", None)
+        if handler is None:
+            return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found: method not found'}
+        return handler(params)
+
+    def _api_getMe(self, params):
+        return 200, {'ok': True, 'result': BOT_USER}
+
+    def _api_deleteWebhook(self, params):
+        if params.get('drop_pending_updates'):
+            with self._lock:
+                self._updates.clear()
+        return 200, {'ok': True, 'result': True}
+
+    def _api_getUpdates(self, params):
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        deadline = time.monotonic() + float(params.get('timeout') or 0)
+        self.polling.set()
+        with self._changed:
+            # offset confirme les updates précédents
+            while self._updates and self._updates[0]['update_id'] < offset:
+                self._updates.popleft()
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._closed:
+                    break
+                self._changed.wait(remaining)
+            updates = list(self._updates)[:limit]
+        return 200, {'ok': True, 'result': updates}
+
+    def _api_sendMessage(self, params):
+        chat_id = int(params['chat_id'])
+        if chat_id in self.reject_chats:
+            return 400, {'ok': False, 'error_code': 400, 'description': 'Bad Request: chat not found'}
+        now = time.monotonic()
+        with self._lock:
+            if self.flood_limit:
+                recent = self._recent_sends.setdefault(chat_id, deque())
+                while recent and now - recent[0] >= 1.0:
+                    recent.popleft()
+                if len(recent) >= self.flood_limit:
+                    self.flood_errors += 1
+                    return 429, {'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after 1',
+                                 'parameters': {'retry_after': 1}}
+                recent.append(now)
+            message = self._message(chat_id, str(params.get('text', '')))
+            self.sent.append({'chat_id': chat_id, 'text': message['text'], 'at': now})
+        if self.send_latency:
+            time.sleep(self.send_latency)
+        message['from'] = BOT_USER
+        return 200, {'ok': True, 'result': message}
+
+    def _api_getChat(self, params):
+        chat_id = int(params['chat_id'])
+        return 200, {'ok': True, 'result': {'id': chat_id, 'type': 'channel', 'title': f"Canal {chat_id}"}}
+
+    def _api_getChatMember(self, params):
+        return 200, {'ok': True, 'result': {'status': 'administrator', 'user': BOT_USER, **_ADMIN_RIGHTS}}
+
+
+def _decode_params(content_type, body):
+    """Paramètres d'un appel (JSON ou formulaire, valeurs encodées en JSON par python-telegram-bot)"""
+    if not body:
+        return {}
+    if content_type.startswith('application/json'):
+        return json.loads(body)
+    params = {}
+    for key, values in parse_qs(body.decode('utf-8'), keep_blank_values=True).items():
+        if key == 'text':
+            params[key] = values[0]
+            continue
+        try:
+            params[key] = json.loads(values[0])
+        except ValueError:
+            params[key] = values[0]
+    return params
+
+
+def _make_handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            try:
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # Client arrêté pendant un long polling
+                self.close_connection = True
+
+        def _handle(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            params = _decode_params(self.headers.get('Content-Type', ''), self.rfile.read(length))
+            path = self.path.split('?', 1)[0]
+
+            if path == '/_inject':
+                update_id = server.post_to_channel(int(params['chat_id']), params['text'], params.get('title'))
+                return self._reply(200, {'ok': True, 'result': update_id})
+            if path == '/_sent':
+                return self._reply(200, {'ok': True, 'result': server.sent_since()})
+            if path == '/_stats':
+                return self._reply(200, {'ok': True, 'result': server.stats()})
+
+            # /bot<token>/<méthode>
+            parts = path.strip('/').split('/')
+            if len(parts) != 2 or not parts[0].startswith('bot'):
+                return self._reply(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+            status, payload = server.call(parts[1], params)
+            self._reply(status, payload)
+
+        do_GET = _handle
+        do_POST = _handle
+
+    return Handler
+
+
+def main(argv=None):
+    args = argparse.ArgumentParser(description="Faux serveur de l'API Bot Telegram")
+    args.add_argument('--host', default='127.0.0.1')
+    args.add_argument('--port', type=int, default=8081)
+    args.add_argument('--send-latency', type=float, default=0.0)
+    args.add_argument('--flood-limit', type=int, default=0)
+    options = args.parse_args(argv)
+    server = FakeTelegramServer(options.host, options.port, options.send_latency, options.flood_limit)
+    server.start()
+    print(f"🧪 Faux serveur Telegram : TELEGRAM_BASE_URL={server.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
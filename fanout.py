@@ -0,0 +1,128 @@
+"""
+Diffusion d'un bilan vers plusieurs canaux de destination
+"""
+import asyncio
+import time
+from datetime import datetime
+from log import get_logger
+from tracing import NOOP_TRACE
+
+logger = get_logger('fanout')
+
+
+class DestinationFanout:
+    """
+    Envoie le même bilan à toutes les destinations en parallèle
+    (asyncio.gather) à travers le dispatcher, donc sur le pool de
+    connexions du bot. Le bilan est rendu une seule fois par filtre de
+    catégories distinct. Suit, par destination, les succès, échecs et la
+    latence des envois.
+    """
+
+    def __init__(self, dispatcher, destinations):
+        self.dispatcher = dispatcher
+        self.destinations = {dest['id']: dest for dest in destinations}
+        self._stats = {
+            dest_id: {
+                'chat_id': dest['chat_id'],
+                'sent': 0,
+                'failed': 0,
+                'last_latency_ms': None,
+                'total_latency_ms': 0.0,
+                'last_success': None,
+                'last_error': None
+            }
+            for dest_id, dest in self.destinations.items()
+        }
+
+    def ids(self):
+        return list(self.destinations)
+
+    def ids_for_source(self, source_id, destination_ids=None):
+        """Destinations (parmi destination_ids) qui reçoivent les bilans de la source"""
+        if destination_ids is None:
+            destination_ids = self.ids()
+        return [
+            dest_id for dest_id in destination_ids
+            if not self.destinations[dest_id].get('sources')
+            or source_id in self.destinations[dest_id]['sources']
+        ]
+
+    def intervals(self):
+        """{id: intervalle propre en minutes ou None}"""
+        return {dest_id: dest.get('interval_minutes') for dest_id, dest in self.destinations.items()}
+
+    async def deliver(self, render_fn, priority, destination_ids=None, trace=NOOP_TRACE):
+        """
+        render_fn(categories) retourne le texte du bilan (categories None =
+        toutes) ou None s'il n'y a rien à envoyer.
+        Retourne {id: True/False} pour chaque destination visée.
+        Un span 'render' par filtre et un span 'send' par destination.
+        """
+        if destination_ids is None:
+            destination_ids = self.ids()
+        if not destination_ids:
+            return {}
+        targets = [self.destinations[dest_id] for dest_id in destination_ids]
+
+        rendered = {}
+        for dest in targets:
+            key = self._filter_key(dest)
+            if key not in rendered:
+                with trace.span('render', categories=list(key) if key else None):
+                    rendered[key] = render_fn(dest.get('categories'))
+
+        results = await asyncio.gather(*(
+            self._send_one(dest, rendered[self._filter_key(dest)], priority, trace)
+            for dest in targets
+        ))
+        return dict(zip(destination_ids, results))
+
+    def _filter_key(self, dest):
+        categories = dest.get('categories')
+        return tuple(sorted(categories)) if categories else None
+
+    async def _send_one(self, dest, text, priority, trace):
+        if not text:
+            return False
+
+        with trace.span('send', destination=dest['id']) as span:
+            sent = await self._send_text(dest, text, priority)
+            if not sent:
+                span['error'] = self._stats[dest['id']]['last_error']
+        return sent
+
+    async def _send_text(self, dest, text, priority):
+        stats = self._stats[dest['id']]
+        start = time.monotonic()
+        try:
+            await self.dispatcher.send(dest['chat_id'], text, priority=priority)
+        except Exception as e:
+            stats['failed'] += 1
+            stats['last_error'] = str(e)
+            logger.error("❌ Erreur envoi vers %s (%s): %s", dest['chat_id'], dest['id'], e,
+                         extra={'destination': dest['id']})
+            return False
+
+        latency_ms = (time.monotonic() - start) * 1000
+        stats['sent'] += 1
+        stats['last_latency_ms'] = round(latency_ms, 1)
+        stats['total_latency_ms'] += latency_ms
+        stats['last_success'] = datetime.now().isoformat()
+        return True
+
+    def stats(self):
+        result = {}
+        for dest_id, stats in self._stats.items():
+            attempts = stats['sent'] + stats['failed']
+            result[dest_id] = {
+                'chat_id': stats['chat_id'],
+                'sent': stats['sent'],
+                'failed': stats['failed'],
+                'success_rate': round(stats['sent'] / attempts, 3) if attempts else None,
+                'last_latency_ms': stats['last_latency_ms'],
+                'avg_latency_ms': round(stats['total_latency_ms'] / stats['sent'], 1) if stats['sent'] else None,
+                'last_success': stats['last_success'],
+                'last_error': stats['last_error']
+            }
+        return result
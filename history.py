@@ -0,0 +1,156 @@
+"""
+Historique partitionné : un fichier JSON par journée, chargé à la demande
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from config import get_current_journee
+
+# Coût mémoire estimé d'une journée décodée : les listes d'écarts dominent
+# (un pointeur par entier, les petits entiers < 257 étant partagés), plus
+# les dicts de chaque catégorie d'heure (clés, max_gap_pair, timestamp)
+BYTES_PER_INT = 8
+BYTES_PER_CATEGORY = 450
+
+
+def estimate_day_size(day):
+    """Taille estimée en mémoire (octets) d'une journée {heure: {'gaps': {catégorie: {...}}}}"""
+    size = 0
+    for hour_data in day.values():
+        for data in hour_data.get('gaps', {}).values():
+            size += BYTES_PER_CATEGORY + BYTES_PER_INT * len(data.get('gaps', ()))
+    return size
+
+
+class PartitionedHistory:
+    """
+    Remplace le dict data['historique'] (même usage : `in`, [], get,
+    affectation, itération sur les journées).
+
+    Seule la liste des journées est lue au démarrage ; le contenu d'une
+    journée est chargé au premier accès et gardé dans un cache LRU dont la
+    taille (estimée d'après les listes décodées, voir estimate_day_size)
+    est bornée par memory_budget octets.
+    La journée courante et les journées modifiées non écrites ne sont
+    jamais évincées.
+    """
+
+    def __init__(self, directory, memory_budget, dumps=json.dumps, loads=json.loads):
+        self.directory = directory
+        self.memory_budget = memory_budget
+        self.dumps = dumps
+        self.loads = loads
+        self._lock = threading.RLock()
+        self._resident = OrderedDict()
+        self._sizes = {}
+        self._dirty = set()
+        self._writing = set()
+        os.makedirs(directory, exist_ok=True)
+        self._known = {
+            name[:-len('.json')]
+            for name in os.listdir(directory)
+            if name.endswith('.json')
+        }
+
+    def path_for(self, journee):
+        return os.path.join(self.directory, f"{journee}.json")
+
+    def __contains__(self, journee):
+        return journee in self._known
+
+    def __iter__(self):
+        return iter(sorted(self._known))
+
+    def __len__(self):
+        return len(self._known)
+
+    def keys(self):
+        return sorted(self._known)
+
+    def items(self):
+        for journee in self.keys():
+            yield journee, self[journee]
+
+    def get(self, journee, default=None):
+        if journee not in self._known:
+            return default
+        return self[journee]
+
+    def __getitem__(self, journee):
+        with self._lock:
+            day = self._resident.get(journee)
+            if day is not None:
+                self._resident.move_to_end(journee)
+                return day
+            if journee not in self._known:
+                raise KeyError(journee)
+            day = self._load(journee)
+            self._resident[journee] = day
+            self._evict()
+            return day
+
+    def __setitem__(self, journee, day):
+        with self._lock:
+            self._known.add(journee)
+            self._resident[journee] = day
+            self._resident.move_to_end(journee)
+            self._sizes[journee] = estimate_day_size(day)
+            self._dirty.add(journee)
+
+    def mark_dirty(self, journee):
+        """À appeler après modification en place d'une journée"""
+        with self._lock:
+            self._dirty.add(journee)
+
+    def _load(self, journee):
+        try:
+            with open(self.path_for(journee), 'r', encoding='utf-8') as f:
+                text = f.read()
+        except OSError:
+            self._sizes[journee] = 0
+            return {}
+        day = self.loads(text)
+        self._sizes[journee] = estimate_day_size(day)
+        return day
+
+    def resident_size(self):
+        """Taille estimée des journées en mémoire (octets)"""
+        return sum(self._sizes.get(journee, 0) for journee in self._resident)
+
+    def _evict(self):
+        """Évince les journées les moins récemment utilisées au-delà du budget"""
+        pinned = get_current_journee()
+        total = self.resident_size()
+        for journee in list(self._resident):
+            if total <= self.memory_budget:
+                break
+            if journee == pinned or journee in self._dirty or journee in self._writing:
+                continue
+            total -= self._sizes.get(journee, 0)
+            del self._resident[journee]
+
+    def take_dirty(self):
+        """
+        Retourne [(journée, copie de la journée)] des journées modifiées, à
+        sérialiser et écrire par l'appelant, qui appelle ensuite written().
+        D'ici là ces journées ne sont pas évincées (le fichier est périmé).
+        Les heures sont remplacées, jamais modifiées en place : une copie
+        superficielle suffit.
+        """
+        with self._lock:
+            days = [(journee, dict(self._resident[journee])) for journee in sorted(self._dirty)]
+            self._writing.update(self._dirty)
+            self._dirty.clear()
+            return days
+
+    def written(self, journees, ok=True):
+        """Fin d'écriture des journées de take_dirty (ok=False : à réécrire)"""
+        with self._lock:
+            self._writing.difference_update(journees)
+            if not ok:
+                self._dirty.update(journees)
+            for journee in journees:
+                if journee in self._resident:
+                    self._sizes[journee] = estimate_day_size(self._resident[journee])
+            self._evict()
@@ -0,0 +1,92 @@
+"""
+File d'attente d'ingestion des messages du canal source
+"""
+import asyncio
+from collections import OrderedDict
+from log import get_logger
+
+logger = get_logger('ingest')
+
+
+class IngestQueue:
+    """
+    File bornée devant le traitement des messages source.
+
+    Les messages sont regroupés par clé (l'heure "HH:00") : un nouveau
+    message pour une clé déjà en attente remplace le précédent, qui n'est
+    donc jamais traité (les statistiques sont cumulatives). Quand la file
+    est pleine, le message de la clé la plus ancienne est évincé pour faire
+    place au nouveau (le plus récent est le plus utile) : put() est appelé
+    depuis le handler d'updates, attendre une place bloquerait toutes les
+    updates, commandes comprises.
+    on_superseded(item, reason), si fourni, est appelé pour chaque message
+    retiré sans être traité (reason : 'coalesced' ou 'evicted').
+    """
+
+    def __init__(self, handler, max_size=4, on_superseded=None):
+        self.handler = handler
+        self.max_size = max_size
+        self.on_superseded = on_superseded
+        self._pending = OrderedDict()
+        self._changed = asyncio.Condition()
+        self.received = 0
+        self.coalesced = 0
+        self.evicted = 0
+        self.processed = 0
+        self.failed = 0
+
+    async def put(self, key, item):
+        """
+        Ajoute un message ; retourne 'queued', 'coalesced' ou 'evicted'
+        (mis en file à la place du message le plus ancien)
+        """
+        async with self._changed:
+            self.received += 1
+            if key in self._pending:
+                self._superseded(self._pending[key], 'coalesced')
+                self._pending[key] = item
+                self.coalesced += 1
+                return 'coalesced'
+
+            outcome = 'queued'
+            if len(self._pending) >= self.max_size:
+                _, oldest = self._pending.popitem(last=False)
+                self._superseded(oldest, 'evicted')
+                self.evicted += 1
+                outcome = 'evicted'
+
+            self._pending[key] = item
+            self._changed.notify_all()
+            return outcome
+
+    def _superseded(self, item, reason):
+        if self.on_superseded is not None:
+            self.on_superseded(item, reason)
+
+    async def run(self):
+        """Consomme la file (un message à la fois, dans l'ordre d'arrivée des clés)"""
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self._pending) > 0)
+                key, item = self._pending.popitem(last=False)
+
+            try:
+                await self.handler(item)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.exception("❌ Erreur traitement message (%s): %s", key, e)
+
+    def depth(self):
+        return len(self._pending)
+
+    def stats(self):
+        return {
+            'depth': len(self._pending),
+            'max_size': self.max_size,
+            'received': self.received,
+            'coalesced': self.coalesced,
+            'evicted': self.evicted,
+            'processed': self.processed,
+            'failed': self.failed
+        }
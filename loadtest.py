@@ -0,0 +1,274 @@
+"""
+Test de charge de bout en bout contre le faux serveur Telegram
+
+    python loadtest.py --rate 2 --duration 60 --sources 2 --destinations 3
+
+Lance fake_telegram.FakeTelegramServer, puis main.py dans un processus à
+part (dossier temporaire, TELEGRAM_BASE_URL pointant sur le faux serveur).
+Le script injecte ensuite des posts "STATISTIQUES COMPLÈTES" au rythme
+demandé et mesure, pour chaque post, le délai jusqu'au sendMessage de
+chaque destination (polling → parsing → stockage → envoi).
+
+Chaque post porte un total de jeux unique (MARKER_BASE + n) que l'on
+retrouve dans la ligne "🎲 N jeux" du bilan. Les envois sans marqueur
+viennent du scheduler (envoi automatique).
+
+Les variables d'environnement déjà définies (SEND_PER_CHAT_RATE,
+WORKER_MODE, STORAGE_BACKEND...) sont transmises au bot telles quelles.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from fake_telegram import FakeTelegramServer
+from synthetic import format_message, generate_games
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+MARKER_BASE = 1_000_000
+_MARKER_RE = re.compile(r'🎲 (\d+) jeux')
+_INGEST_RE = re.compile(r'^ecarts_ingest_total\{.*outcome="(\w+)"\} (\d+)', re.MULTILINE)
+DEFAULT_OUTPUT = 'loadtest_results.json'
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _latency_stats(latencies):
+    values = sorted(latencies)
+    if not values:
+        return None
+    return {
+        'count': len(values),
+        'mean_ms': round(sum(values) / len(values) * 1000, 1),
+        'p50_ms': round(_percentile(values, 0.50) * 1000, 1),
+        'p90_ms': round(_percentile(values, 0.90) * 1000, 1),
+        'p99_ms': round(_percentile(values, 0.99) * 1000, 1),
+        'max_ms': round(values[-1] * 1000, 1)
+    }
+
+
+def bot_environment(server, workdir, options):
+    """Configuration du bot : canaux fictifs, faux serveur, fichiers dans workdir"""
+    sources = [
+        {'id': f"src{i + 1}", 'chat_id': -1001000000000 - i, 'label': f"Table {i + 1}"}
+        for i in range(options.sources)
+    ]
+    destinations = [
+        {'id': f"dest{i + 1}", 'chat_id': -1002000000000 - i, 'interval_minutes': options.interval}
+        for i in range(options.destinations)
+    ]
+    env = dict(os.environ)
+    env.update({
+        'BOT_TOKEN': '123456:LOADTEST',
+        'TELEGRAM_BASE_URL': server.base_url,
+        'SOURCES': json.dumps(sources),
+        'DESTINATIONS': json.dumps(destinations),
+        'PORT': str(options.http_port)
+    })
+    # Limites d'envoi du bot levées par défaut : on mesure la chaîne, pas le quota
+    env.setdefault('SEND_PER_CHAT_RATE', '1000')
+    env.setdefault('SEND_PER_CHAT_BURST', '100')
+    env.setdefault('SEND_GLOBAL_RATE', '1000')
+    env.setdefault('LOG_LEVEL', 'WARNING')
+    env.setdefault('TRACE_FILE', os.path.join(workdir, 'traces.jsonl'))
+    # Traçage complet pendant le test de charge
+    env.setdefault('TRACE_SAMPLE_RATE', '1')
+    return env, sources, destinations
+
+
+def _fetch(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.read().decode('utf-8')
+    except OSError:
+        return None
+
+
+def _message_marker(message):
+    match = _MARKER_RE.search(message['text'])
+    return int(match.group(1)) if match else None
+
+
+def _delivered_pairs(messages, injected, dest_chats):
+    """Couples (destination, marqueur) distincts des posts injectés"""
+    return {
+        (dest_chats[message['chat_id']], marker)
+        for message in messages
+        if message['chat_id'] in dest_chats and (marker := _message_marker(message)) in injected
+    }
+
+
+def run(options):
+    server = FakeTelegramServer(send_latency=options.send_latency, flood_limit=options.flood_limit).start()
+    workdir = tempfile.mkdtemp(prefix='loadtest_')
+    env, sources, destinations = bot_environment(server, workdir, options)
+    dest_chats = {dest['chat_id']: dest['id'] for dest in destinations}
+    log_file = open(os.path.join(workdir, 'bot.log'), 'w', encoding='utf-8')
+    bot = subprocess.Popen([sys.executable, MAIN_SCRIPT], cwd=workdir, env=env,
+                           stdout=log_file, stderr=subprocess.STDOUT)
+    try:
+        print(f"🤖 Bot lancé (pid {bot.pid}, dossier {workdir})", flush=True)
+        while not server.polling.wait(0.5):
+            if bot.poll() is not None:
+                raise RuntimeError(f"Le bot s'est arrêté (code {bot.returncode}), voir {workdir}/bot.log")
+
+        # Injection à rythme constant
+        count = int(options.rate * options.duration)
+        injected = {}
+        start = time.monotonic()
+        print(f"📨 Injection de {count} posts ({options.rate}/s pendant {options.duration} s)", flush=True)
+        for n in range(count):
+            delay = start + n / options.rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            marker = MARKER_BASE + n
+            text = format_message(generate_games(options.games, seed=n), marker, options.style)
+            injected[marker] = time.monotonic()
+            server.post_to_channel(sources[n % len(sources)]['chat_id'], text)
+        injection_end = time.monotonic()
+
+        # Attente des derniers envois (arrêt si plus rien n'arrive). Seuls
+        # les couples (destination, post) distincts comptent : l'envoi
+        # automatique au démarrage répète le marqueur du dernier post reçu
+        expected = len(injected) * len(destinations)
+        deadline = injection_end + options.drain
+        last_count, last_change = -1, time.monotonic()
+        while time.monotonic() < deadline:
+            delivered = len(_delivered_pairs(server.sent_since(), injected, dest_chats))
+            if delivered >= expected:
+                break
+            if delivered != last_count:
+                last_count, last_change = delivered, time.monotonic()
+            elif time.monotonic() - last_change > options.idle:
+                break
+            time.sleep(0.2)
+
+        metrics_text = _fetch(f"http://127.0.0.1:{options.http_port}/metrics")
+        if metrics_text:
+            with open(os.path.join(workdir, 'metrics.txt'), 'w', encoding='utf-8') as f:
+                f.write(metrics_text)
+    finally:
+        if bot.poll() is None:
+            bot.send_signal(signal.SIGINT)
+            try:
+                bot.wait(15)
+            except subprocess.TimeoutExpired:
+                bot.kill()
+        log_file.close()
+        server.stop()
+
+    return summarize(options, server, injected, start, injection_end, dest_chats, metrics_text, workdir)
+
+
+def summarize(options, server, injected, start, injection_end, dest_chats, metrics_text, workdir):
+    latencies = []
+    per_destination = {dest_id: {'delivered': 0, 'latencies': []} for dest_id in dest_chats.values()}
+    seen = set()
+    scheduled = {dest_id: [] for dest_id in dest_chats.values()}
+    last_delivery = start
+    for message in server.sent_since():
+        dest_id = dest_chats.get(message['chat_id'])
+        if dest_id is None:
+            continue
+        marker = _message_marker(message)
+        if marker not in injected:
+            scheduled[dest_id].append(round(message['at'] - start, 3))
+            continue
+        if (dest_id, marker) in seen:
+            continue
+        seen.add((dest_id, marker))
+        latency = message['at'] - injected[marker]
+        latencies.append(latency)
+        per_destination[dest_id]['delivered'] += 1
+        per_destination[dest_id]['latencies'].append(latency)
+        last_delivery = max(last_delivery, message['at'])
+
+    delivered_posts = {marker for _, marker in seen}
+    ingest = {}
+    for outcome, value in _INGEST_RE.findall(metrics_text or ''):
+        ingest[outcome] = ingest.get(outcome, 0) + int(value)
+
+    return {
+        'config': {
+            'rate': options.rate, 'duration': options.duration, 'sources': options.sources,
+            'destinations': options.destinations, 'games': options.games, 'style': options.style,
+            'send_latency': options.send_latency, 'flood_limit': options.flood_limit,
+            'interval_minutes': options.interval
+        },
+        'injected': len(injected),
+        'injection_seconds': round(injection_end - start, 2),
+        'posts_delivered': len(delivered_posts),
+        # Posts regroupés dans la file d'ingestion (même heure), abandonnés
+        # (file pleine) ou pas encore traités à la fin de l'attente (voir 'ingest')
+        'posts_not_delivered': len(injected) - len(delivered_posts),
+        'ingest': ingest,
+        'deliveries': len(latencies),
+        'throughput_per_s': round(len(latencies) / (last_delivery - start), 2) if latencies else 0.0,
+        'latency': _latency_stats(latencies),
+        'destinations': {
+            dest_id: {'delivered': data['delivered'], 'latency': _latency_stats(data['latencies'])}
+            for dest_id, data in per_destination.items()
+        },
+        'scheduled_sends': scheduled,
+        'server': server.stats(),
+        'workdir': workdir
+    }
+
+
+def main(argv=None):
+    args = argparse.ArgumentParser(description="Test de charge de bout en bout (faux serveur Telegram)")
+    args.add_argument('--rate', type=float, default=1.0, help="Posts injectés par seconde")
+    args.add_argument('--duration', type=float, default=30.0, help="Durée de l'injection (s)")
+    args.add_argument('--sources', type=int, default=1)
+    args.add_argument('--destinations', type=int, default=1)
+    args.add_argument('--games', type=int, default=60, help="Jeux par message")
+    args.add_argument('--style', default='config', help="Format des messages (synthetic.STYLES)")
+    args.add_argument('--interval', type=int, default=None, help="Intervalle d'envoi auto des destinations (min)")
+    args.add_argument('--send-latency', type=float, default=0.0, help="Délai de réponse de sendMessage (s)")
+    args.add_argument('--flood-limit', type=int, default=0, help="sendMessage/s par chat avant 429 (0 = illimité)")
+    args.add_argument('--drain', type=float, default=60.0, help="Attente max des derniers envois (s)")
+    args.add_argument('--idle', type=float, default=5.0, help="Arrêt si aucun envoi pendant ce délai (s)")
+    args.add_argument('--http-port', type=int, default=None, help="Port Flask du bot (défaut : libre)")
+    args.add_argument('--keep', action='store_true', help="Garder le dossier de travail (logs, données, traces)")
+    args.add_argument('-o', '--output', default=DEFAULT_OUTPUT)
+    options = args.parse_args(argv)
+    if options.http_port is None:
+        options.http_port = _free_port()
+
+    report = run(options)
+    if not options.keep:
+        shutil.rmtree(report['workdir'], ignore_errors=True)
+        report['workdir'] = None
+    with open(options.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    latency = report['latency'] or {}
+    print(f"✅ {report['posts_delivered']}/{report['injected']} posts livrés, "
+          f"{report['deliveries']} envois, {report['throughput_per_s']} envois/s")
+    if latency:
+        print(f"⏱️  Latence : p50 {latency['p50_ms']} ms, p90 {latency['p90_ms']} ms, "
+              f"p99 {latency['p99_ms']} ms, max {latency['max_ms']} ms")
+    print(f"💾 Résultats : {options.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Journalisation : niveaux, formatage paresseux, sortie non bloquante
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from datetime import datetime
+from config import LOG_LEVEL, LOG_FORMAT
+
+ROOT_LOGGER = 'ecarts'
+TEXT_FORMAT = '%(asctime)s %(levelname)-7s %(message)s'
+
+# Attributs standard d'un LogRecord : le reste vient de `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Une ligne JSON par événement ; les champs passés via `extra` sont inclus"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _make_formatter(fmt):
+    return JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT)
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """
+    Configure le logger racine 'ecarts' : les appels ne font que déposer
+    l'enregistrement dans une file (QueueHandler) ; un thread
+    (QueueListener) formate et écrit sur stdout. Idempotent.
+    """
+    global _listener
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level)
+    root.propagate = False
+    if _listener is not None:
+        return root
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(_make_formatter(fmt))
+    log_queue = queue.SimpleQueue()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return root
+
+
+def setup_worker_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """
+    Dans un processus du pool : pas de thread d'écriture hérité, on écrit
+    directement (sinon la file copiée au fork ne serait jamais vidée)
+    """
+    global _listener
+    _listener = None
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level)
+    root.propagate = False
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(_make_formatter(fmt))
+    root.handlers = [stream]
+    return root
+
+
+def stop_logging():
+    """Vide la file et arrête le thread d'écriture"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name):
+    """Logger enfant de 'ecarts' (ex. get_logger('parser') → 'ecarts.parser')"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
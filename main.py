@@ -3,37 +3,66 @@ Point d'entrée principal du Bot Telegram
 """
 import os
 import sys
+import signal
 import asyncio
+import logging
 import threading
-from datetime import datetime, timedelta
-from flask import Flask
+import time
+from datetime import datetime
+from flask import Flask, Response
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 
 from config import (
-    API_ID, API_HASH, BOT_TOKEN, PORT, HOST,
-    SOURCE_CHANNEL_ID, DESTINATION_CHANNEL_ID,
+    API_ID, API_HASH, BOT_TOKEN, TELEGRAM_BASE_URL, PORT, HOST,
+    SOURCE_CHANNEL_ID, DESTINATION_CHANNEL_ID, SOURCES,
     ADMIN_ID, ADMIN_USER_IDS,
-    MIN_INTERVAL_MINUTES, MAX_INTERVAL_MINUTES,
+    MIN_INTERVAL_MINUTES, MAX_INTERVAL_MINUTES, TENDANCES_MAX_DAYS,
+    SEND_WORKERS, SEND_PER_CHAT_RATE, SEND_PER_CHAT_BURST, SEND_GLOBAL_RATE,
+    SEND_MAX_RETRIES, SEND_BACKOFF_BASE, SEND_BACKOFF_MAX, SEND_POOL_SIZE,
+    DESTINATIONS, PROFILE_MESSAGES, PROFILE_SECONDS,
     get_channels_info, validate_configuration
 )
-from storage import Storage
-from parser import MessageParser
 from analyzer import GapAnalyzer
-from bot import BotLogic
+from pipeline import STATUS_DUPLICATE
+from scheduler import AutoSendScheduler
+from sources import create_sources
+from log import setup_logging, get_logger
+from metrics import REGISTRY, MESSAGES, INGEST
+from tracing import Tracer
+from profiling import Profiler, format_report
+from dispatcher import OutboundDispatcher, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from fanout import DestinationFanout
+from channels import ChannelStatusCache
 
 app = Flask(__name__)
-
-storage = Storage()
-parser = MessageParser()
+logger = get_logger('main')
+
+profiler = Profiler()
+sources = create_sources(SOURCES, profiler)
+sources_by_chat = {source.chat_id: source for source in sources.values()}
+primary_source = next(iter(sources.values()))
+# Réglages (intervalle, envoi auto, derniers envois) : stockage de la source principale
+storage = primary_source.storage
 analyzer = GapAnalyzer()
-bot_logic = BotLogic(storage)
+bot_logic = primary_source.bot_logic
+dispatcher = OutboundDispatcher(
+    workers=SEND_WORKERS,
+    per_chat_rate=SEND_PER_CHAT_RATE,
+    per_chat_burst=SEND_PER_CHAT_BURST,
+    global_rate=SEND_GLOBAL_RATE,
+    max_retries=SEND_MAX_RETRIES,
+    backoff_base=SEND_BACKOFF_BASE,
+    backoff_max=SEND_BACKOFF_MAX
+)
+fanout = DestinationFanout(dispatcher, DESTINATIONS)
+tracer = Tracer()
 
-_channel_status_cache = {
-    'source': None,
-    'destination': None,
-    'last_check': None
-}
+# Statut du bot dans tous les canaux configurés (rafraîchi en tâche de fond)
+channel_status = ChannelStatusCache(
+    [('source', source.id, source.chat_id) for source in sources.values()]
+    + [('destination', dest['id'], dest['chat_id']) for dest in DESTINATIONS]
+)
 
 # ============ FLASK ROUTES ============
 
@@ -52,14 +81,13 @@ def home():
     
     validation = validate_configuration()
     status_emoji = "✅" if validation['valid'] else "❌"
-    channels = get_channels_info()
     
-    source_status = "⏳ Non vérifié"
-    dest_status = "⏳ Non vérifié"
-    
-    if _channel_status_cache['last_check']:
-        source_status = "✅ Membre" if _channel_status_cache['source'] else "❌ Non membre"
-        dest_status = "✅ Membre" if _channel_status_cache['destination'] else "❌ Non membre"
+    channel_items = ""
+    for role, channel_id, chat_id in channel_status.channels:
+        member = channel_status.is_member(chat_id)
+        status = "⏳ Non vérifié" if member is None else ("✅ Membre" if member else "❌ Non membre")
+        label = "Source" if role == 'source' else "Destination"
+        channel_items += f"<li>{label} {channel_id}: <code>{chat_id}</code> - {status}</li>"
     
     html_content = f"""
     <h1>{status_emoji} Bot d'Analyse d'Écarts</h1>
@@ -71,8 +99,7 @@ def home():
     </ul>
     <h3>📺 Canaux Configurés</h3>
     <ul>
-        <li>Source: <code>{channels['source']}</code> - {source_status}</li>
-        <li>Destination: <code>{channels['destination']}</code> - {dest_status}</li>
+        {channel_items}
     </ul>
     <h3>👤 Admin: <code>{ADMIN_ID}</code></h3>
     <h3>⚙️ Paramètres</h3>
@@ -113,95 +140,73 @@ def health():
         "channels": {
             "source": {
                 "id": channels['source'],
-                "status": "member" if _channel_status_cache['source'] else "unknown"
+                "status": "member" if channel_status.is_member(channels['source']) else "unknown"
             },
             "destination": {
                 "id": channels['destination'],
-                "status": "member" if _channel_status_cache['destination'] else "unknown"
-            }
+                "status": "member" if channel_status.is_member(channels['destination']) else "unknown"
+            },
+            "last_check": channel_status.last_check,
+            "checks": channel_status.results()
         },
+        "sources": {source_id: source.stats() for source_id, source in sources.items()},
+        "dispatcher": dispatcher.stats(),
+        "destinations": fanout.stats(),
+        "tracing": tracer.stats(),
+        "profiling": profiler.status(),
         "errors": validation['errors'] if validation['errors'] else None
     }
 
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 # ============ UTILITAIRES ============
 
 def is_admin(user_id):
     """Vérifie si l'utilisateur est admin"""
     return user_id == ADMIN_ID or user_id in ADMIN_USER_IDS
 
-async def check_bot_in_channel(bot, channel_id):
+async def send_bilan_to_destinations(destination_ids=None, trigger='scheduler'):
     """
-    Vérifie si le bot est membre d'un canal
-    Retourne: (success: bool, is_member: bool, error_message: str)
+    Envoie le bilan aux canaux de destination (tous par défaut), en parallèle
+    Retourne: {id destination: succès}
     """
+    trace = tracer.start_trace('auto_send', trigger=trigger, destinations=destination_ids)
     try:
-        chat = await bot.get_chat(channel_id)
-        member = await bot.get_chat_member(channel_id, (await bot.get_me()).id)
-        can_send = member.status in ['administrator', 'member', 'creator']
-        
-        return True, can_send, None
-        
-    except Exception as e:
-        error_msg = str(e)
-        if "chat not found" in error_msg.lower():
-            return False, False, "Canal non trouvé (ID invalide ou bot non membre)"
-        elif "user not participant" in error_msg.lower():
-            return False, False, "Bot non membre du canal"
-        elif "forbidden" in error_msg.lower():
-            return False, False, "Bot sans permission d'accès"
-        else:
-            return False, False, f"Erreur: {error_msg}"
-
-async def update_channel_status_cache(bot):
-    """Met à jour le cache du statut des canaux"""
-    global _channel_status_cache
-    
-    print("🔍 Vérification du statut des canaux...")
-    
-    success_src, is_member_src, error_src = await check_bot_in_channel(bot, SOURCE_CHANNEL_ID)
-    if success_src:
-        _channel_status_cache['source'] = is_member_src
-        print(f"   Source {SOURCE_CHANNEL_ID}: {'✅' if is_member_src else '❌'}")
-    else:
-        _channel_status_cache['source'] = False
-        print(f"   Source {SOURCE_CHANNEL_ID}: ❌ ({error_src})")
-    
-    success_dest, is_member_dest, error_dest = await check_bot_in_channel(bot, DESTINATION_CHANNEL_ID)
-    if success_dest:
-        _channel_status_cache['destination'] = is_member_dest
-        print(f"   Destination {DESTINATION_CHANNEL_ID}: {'✅' if is_member_dest else '❌'}")
-    else:
-        _channel_status_cache['destination'] = False
-        print(f"   Destination {DESTINATION_CHANNEL_ID}: ❌ ({error_dest})")
-    
-    _channel_status_cache['last_check'] = datetime.now().isoformat()
-    
-    return {
-        'source': {'ok': success_src, 'member': is_member_src, 'error': error_src},
-        'destination': {'ok': success_dest, 'member': is_member_dest, 'error': error_dest}
-    }
-
-async def send_bilan_to_destination(context: ContextTypes.DEFAULT_TYPE):
-    """Envoie le bilan au canal de destination"""
-    try:
-        bilan = bot_logic.format_auto_send_bilan()
-        if not bilan:
-            print("⚠️ Aucune donnée disponible pour l'envoi automatique")
-            return False
+        ready = [source for source in sources.values() if source.storage.get_last_parsed_data() is not None]
+        if not ready:
+            logger.warning("⚠️ Aucune donnée disponible pour l'envoi automatique")
+            trace.finish(status='no_data')
+            return {}
         
-        await context.bot.send_message(
-            chat_id=DESTINATION_CHANNEL_ID, 
-            text=bilan, 
-            parse_mode='Markdown'
-        )
+        # Un bilan par source, toutes les sources en parallèle
+        per_source = await asyncio.gather(*(
+            fanout.deliver(
+                source.bot_logic.format_auto_send_bilan, PRIORITY_NORMAL,
+                fanout.ids_for_source(source.id, destination_ids), trace
+            )
+            for source in ready
+        ))
+        results = {}
+        for source_results in per_source:
+            for dest_id, sent in source_results.items():
+                results[dest_id] = results.get(dest_id, True) and sent
         
-        storage.update_last_auto_send()
-        print(f"✅ Bilan auto envoyé à {DESTINATION_CHANNEL_ID} à {datetime.now().strftime('%H:%M:%S')}")
-        return True
+        with trace.span('update_last_auto_send'):
+            for dest_id, sent in results.items():
+                if sent:
+                    storage.update_last_auto_send(dest_id)
+                    logger.info("✅ Bilan auto envoyé à %s", dest_id, extra={'destination': dest_id})
+            if any(results.values()):
+                storage.update_last_auto_send()
+        trace.finish(status='sent', sent=sum(1 for ok in results.values() if ok), total=len(results))
+        return results
         
     except Exception as e:
-        print(f"❌ Erreur envoi auto vers {DESTINATION_CHANNEL_ID}: {e}")
-        return False
+        logger.exception("❌ Erreur envoi auto: %s", e)
+        trace.finish(status='error', error=str(e))
+        return {}
 
 # ============ COMMANDES PUBLIQUES ============
 
@@ -222,6 +227,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 /verifier - 🔍 Vérifier l'accès aux canaux
 /test - Tester l'analyse
 /historique - Voir l'historique
+/tendances [jours] - Statistiques des dernières journées
 /restart - Redémarrer
 """
     
@@ -232,6 +238,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 /auto <on/off> - Activer/désactiver l'envoi auto
 /envoyer - Forcer l'envoi immédiat
 /testenvoi - Tester l'envoi avec données fictives
+/profil <N|Ns|stop> - Profiler N messages ou N secondes
 """
     
     welcome_msg += f"\n⏰ Envoi auto: **{storage.get_interval_minutes()}** min."
@@ -292,36 +299,31 @@ async def verifier_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
-    await update.message.reply_text(
-        "🔍 **Vérification des canaux en cours...**\n"
-        "Cela peut prendre quelques secondes.", 
-        parse_mode='Markdown'
-    )
-    
-    results = await update_channel_status_cache(context.bot)
-    
-    channels = get_channels_info()
-    
-    source_emoji = "✅" if results['source']['member'] else "❌"
-    dest_emoji = "✅" if results['destination']['member'] else "❌"
-    
-    source_detail = ""
-    if not results['source']['ok'] and results['source']['error']:
-        source_detail = f"\n   _{results['source']['error']}_"
-    
-    dest_detail = ""
-    if not results['destination']['ok'] and results['destination']['error']:
-        dest_detail = f"\n   _{results['destination']['error']}_"
+    # Résultats du cache (tâche de fond) ; `/verifier force` revérifie tout
+    force = bool(context.args) and context.args[0].lower() == 'force'
+    if force:
+        await update.message.reply_text("🔍 **Vérification des canaux en cours...**", parse_mode='Markdown')
+    results = await channel_status.refresh(context.bot, max_age=0 if force else None)
+    
+    sections = []
+    for role, title in (('source', "📥 **Canaux Source:**"), ('destination', "📤 **Canaux Destination:**")):
+        lines = [title]
+        for result in results:
+            if result['role'] != role:
+                continue
+            emoji = "✅" if result['member'] else "❌"
+            lines.append(f"{emoji} `{result['chat_id']}` (`{result['id']}`)")
+            if not result['ok'] and result['error']:
+                lines.append(f"   _{result['error']}_")
+        sections.append("\n".join(lines))
+    channels_text = "\n\n".join(sections)
+    checked = datetime.fromisoformat(channel_status.last_check).strftime('%H:%M:%S') if channel_status.last_check else "-"
     
     msg = f"""🔍 **Résultat de la Vérification**
 
-📥 **Canal Source:**
-{source_emoji} `{channels['source']}`
-{source_detail}
+{channels_text}
 
-📤 **Canal Destination:**
-{dest_emoji} `{channels['destination']}`
-{dest_detail}
+🕐 Vérifié à {checked} - `/verifier force` pour revérifier
 
 💡 **Conseils si ❌:**
 • Vérifiez que les IDs sont corrects
@@ -354,13 +356,45 @@ async def test_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(msg, parse_mode='Markdown')
 
 async def historique_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    msg = bot_logic.format_historique()
+    source = primary_source
+    if context.args:
+        source = sources.get(context.args[0])
+        if source is None:
+            await update.message.reply_text(
+                f"❌ Source inconnue. Sources: `{', '.join(sources)}`", parse_mode='Markdown'
+            )
+            return
+    msg = source.bot_logic.format_historique()
+    await update.message.reply_text(msg, parse_mode='Markdown')
+
+async def tendances_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/tendances [jours] [source] : max, moyenne et percentiles des écarts par journée"""
+    args = list(context.args or [])
+    days = 3
+    if args and args[0].isdigit():
+        days = int(args.pop(0))
+    if not 1 <= days <= TENDANCES_MAX_DAYS:
+        await update.message.reply_text(
+            f"❌ Nombre de journées invalide. Entre 1 et {TENDANCES_MAX_DAYS}.", parse_mode='Markdown'
+        )
+        return
+    source = primary_source
+    if args:
+        source = sources.get(args[0])
+        if source is None:
+            await update.message.reply_text(
+                f"❌ Source inconnue. Sources: `{', '.join(sources)}`", parse_mode='Markdown'
+            )
+            return
+    msg = source.bot_logic.format_tendances(days)
     await update.message.reply_text(msg, parse_mode='Markdown')
 
 async def restart_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("🔄 Redémarrage...", parse_mode='Markdown')
     try:
-        storage.save_data()
+        # Toutes les sources : chacune a son propre stockage
+        for source in sources.values():
+            source.storage.save_data()
         await update.message.reply_text("✅ Bot redémarré!", parse_mode='Markdown')
     except Exception as e:
         await update.message.reply_text(f"❌ Erreur: {str(e)}", parse_mode='Markdown')
@@ -395,6 +429,7 @@ async def intervalle_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
             return
         
         storage.set_interval_minutes(new_interval)
+        auto_scheduler.rearm()
         msg = bot_logic.format_interval_update(new_interval)
         await update.message.reply_text(msg, parse_mode='Markdown')
         
@@ -421,15 +456,17 @@ async def auto_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     arg = context.args[0].lower()
     if arg in ['on', 'true', '1', 'oui']:
         storage.set_auto_send_enabled(True)
+        auto_scheduler.rearm()
         await update.message.reply_text(bot_logic.format_auto_send_status(True), parse_mode='Markdown')
     elif arg in ['off', 'false', '0', 'non']:
         storage.set_auto_send_enabled(False)
+        auto_scheduler.rearm()
         await update.message.reply_text(bot_logic.format_auto_send_status(False), parse_mode='Markdown')
     else:
         await update.message.reply_text("❌ Usage: `/auto <on/off>`", parse_mode='Markdown')
 
 async def envoyer_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Force l'envoi immédiat du bilan vers DESTINATION_CHANNEL_ID"""
+    """Force l'envoi immédiat du bilan vers tous les canaux de destination"""
     user_id = update.effective_user.id
     
     if not is_admin(user_id):
@@ -466,10 +503,21 @@ async def envoyer_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode='Markdown'
     )
     
-    success = await send_bilan_to_destination(context)
+    results = await send_bilan_to_destinations(trigger='envoyer')
+    sent = [dest_id for dest_id, ok in results.items() if ok]
+    failed = [dest_id for dest_id, ok in results.items() if not ok]
     
-    if success:
+    if sent:
+        auto_scheduler.rearm()
+    
+    if sent and not failed:
         await update.message.reply_text("✅ Bilan envoyé avec succès!", parse_mode='Markdown')
+    elif sent:
+        await update.message.reply_text(
+            f"⚠️ Bilan envoyé à {len(sent)}/{len(results)} destinations\n"
+            f"❌ Échec: `{', '.join(failed)}`",
+            parse_mode='Markdown'
+        )
     else:
         await update.message.reply_text(
             """❌ **Échec de l'envoi**
@@ -518,14 +566,16 @@ async def testenvoi_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         analysis = analyzer.analyze_all_categories(test_data)
         hour_str = datetime.now().strftime('%H:%M')
-        bilan_msg = bot_logic.format_bilan(analysis, test_data['total_games'], hour_str)
-        
-        # Envoyer au canal destination
-        await context.bot.send_message(
-            chat_id=DESTINATION_CHANNEL_ID,
-            text=bilan_msg + "\n\n🧪 *Message de test*", 
-            parse_mode='Markdown'
+        # Envoyer aux canaux destination
+        results = await fanout.deliver(
+            lambda categories: bot_logic.format_bilan(
+                analysis, test_data['total_games'], hour_str, categories=categories
+            ) + "\n\n🧪 *Message de test*",
+            PRIORITY_LOW
         )
+        failed = [dest_id for dest_id, ok in results.items() if not ok]
+        if failed:
+            raise RuntimeError(f"envoi impossible vers {', '.join(failed)}")
         
         await update.message.reply_text(
             f"""✅ **Test réussi!**
@@ -554,110 +604,227 @@ async def testenvoi_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             parse_mode='Markdown'
         )
 
+def _profile_finished(chat_id):
+    """Callback de fin de session : résumé envoyé à l'admin qui l'a lancée"""
+    def notify(report):
+        logger.info("%s", format_report(report))
+        if chat_id:
+            asyncio.create_task(dispatcher.send(chat_id, format_report(report), parse_mode=None,
+                                                priority=PRIORITY_LOW))
+    return notify
+
+async def profil_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    
+    if not is_admin(user_id):
+        await update.message.reply_text("❌ Commande réservée aux administrateurs.", parse_mode='Markdown')
+        return
+    
+    if not context.args:
+        status = profiler.status()
+        if status['active']:
+            limit = f"/{status['messages_limit']}" if status['messages_limit'] else ''
+            msg = (f"🔬 Profilage en cours depuis {status['elapsed']} s "
+                   f"({status['messages']}{limit} messages)\n\n`/profil stop` pour l'arrêter")
+        else:
+            msg = ("🔬 Aucun profilage en cours\n\n"
+                   "Usage:\n`/profil 20` - 20 prochains messages\n"
+                   "`/profil 300s` - 300 secondes\n`/profil stop` - Arrêter et afficher le résumé")
+        await update.message.reply_text(msg, parse_mode='Markdown')
+        return
+    
+    arg = context.args[0].lower()
+    if arg == 'stop':
+        report = profiler.stop()
+        if report is None:
+            await update.message.reply_text("⚠️ Aucun profilage en cours.", parse_mode='Markdown')
+        else:
+            await update.message.reply_text(format_report(report))
+        return
+    
+    try:
+        if arg.endswith('s'):
+            messages, seconds = None, int(arg[:-1])
+        else:
+            messages, seconds = int(arg), None
+        if (messages or seconds or 0) <= 0:
+            raise ValueError(arg)
+    except ValueError:
+        await update.message.reply_text("❌ Usage: `/profil <N|Ns|stop>`", parse_mode='Markdown')
+        return
+    
+    try:
+        profiler.start(messages, seconds, _profile_finished(update.effective_chat.id))
+    except RuntimeError as e:
+        await update.message.reply_text(f"⚠️ {e}. `/profil stop` pour l'arrêter.", parse_mode='Markdown')
+        return
+    target = f"{messages} prochains messages" if messages else f"{seconds} secondes"
+    await update.message.reply_text(
+        f"🔬 Profilage démarré pour {target} (cProfile + tracemalloc)", parse_mode='Markdown'
+    )
+
 # ============ GESTION MESSAGES CANAL ============
 
 async def handle_channel_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Traite les messages du canal source configuré"""
+    """Traite les messages des canaux source configurés"""
     if not update.channel_post:
         return
     
-    if update.channel_post.chat_id != SOURCE_CHANNEL_ID:
+    source = sources_by_chat.get(update.channel_post.chat_id)
+    if source is None:
         return
     
     message_text = update.channel_post.text
     
-    print(f"\n{'='*50}")
-    print(f"📥 MESSAGE REÇU à {datetime.now().strftime('%H:%M:%S')}")
-    print(f"📍 Canal: {update.channel_post.chat_id}")
-    print(f"📝 Début: {message_text[:100]}...")
-    print(f"{'='*50}\n")
+    logger.info("📥 Message reçu du canal %s (%s)", update.channel_post.chat_id, source.id,
+                extra={'source': source.id})
+    if message_text and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("📝 Début: %s...", message_text[:100])
     
     if not message_text or 'STATISTIQUES COMPLÈTES' not in message_text:
-        print("❌ Message ignoré: ne contient pas 'STATISTIQUES COMPLÈTES'")
+        logger.info("❌ Message ignoré: ne contient pas 'STATISTIQUES COMPLÈTES'")
+        INGEST.inc(source=source.id, outcome='ignored')
         return
     
+    received_at = datetime.now()
+    hour_key = received_at.strftime('%H:00')
+    trace = tracer.start_trace(
+        'source_message', source=source.id, message_id=update.channel_post.message_id, hour=hour_key
+    )
+    outcome = await source.ingest_queue.put(hour_key, {
+        'text': message_text,
+        'received_at': received_at,
+        'queued_at': time.perf_counter(),
+        'trace': trace
+    })
+    INGEST.inc(source=source.id, outcome=outcome)
+    if outcome == 'coalesced':
+        logger.info("🔁 Message regroupé avec celui déjà en attente pour %s", hour_key)
+    elif outcome == 'evicted':
+        logger.error("❌ File d'ingestion pleine - plus ancien message en attente évincé pour %s", hour_key,
+                     extra={'source': source.id})
+
+async def process_channel_message(source, item):
+    """Traite un message sorti de la file d'ingestion d'une source (une trace par message)"""
+    trace = item['trace']
+    trace.add_span('ingest_wait', item['queued_at'], time.perf_counter())
+    try:
+        status = await _process_message(source, item, trace)
+    except Exception as e:
+        trace.finish(status='error', error=str(e))
+        raise
+    finally:
+        if profiler.active:
+            profiler.message_done()
+    trace.finish(status=status)
+
+async def _process_message(source, item, trace):
+    message_text = item['text']
+    
     # DEBUG: Sauvegarder le message brut pour analyse
     try:
-        with open('last_message_debug.txt', 'w', encoding='utf-8') as f:
-            f.write(message_text)
-        print("💾 Message sauvegardé dans last_message_debug.txt")
+        with trace.span('debug_file'):
+            with open(source.debug_file, 'w', encoding='utf-8') as f:
+                f.write(message_text)
+        logger.debug("💾 Message sauvegardé dans %s", source.debug_file)
     except Exception as e:
-        print(f"⚠️ Impossible de sauvegarder: {e}")
+        logger.warning("⚠️ Impossible de sauvegarder: %s", e)
     
-    parsed_data = parser.parse_message(message_text)
+    result = await source.pipeline.process_async(message_text)
+    MESSAGES.inc(source=source.id, status=result['status'])
+    for stage, (start, end) in result['timings'].items():
+        trace.add_span(stage, start, end)
+    
+    if result['status'] == STATUS_DUPLICATE:
+        logger.info("♻️ Message identique déjà traité (%s) - ignoré", result['digest'][:12])
+        return result['status']
+    
+    parsed_data = result['parsed']
     
     if not parsed_data:
-        print("❌ ÉCHEC DU PARSING - Message incomplet ou format non reconnu")
-        print("💡 Vérifiez que toutes les catégories sont présentes dans le message")
-        return
+        logger.error("❌ ÉCHEC DU PARSING - Message incomplet ou format non reconnu",
+                     extra={'source': source.id})
+        trace.error = 'parsing'
+        return result['status']
     
-    print(f"✅ PARSING RÉUSSI: {len(parsed_data['categories'])} catégories")
+    logger.info("✅ Parsing réussi: %d catégories", len(parsed_data['categories']),
+                extra={'source': source.id})
     
     # Suite du traitement
-    analysis = analyzer.analyze_all_categories(parsed_data)
-    now = datetime.now()
-    hour_str = now.strftime('%H:%M')
-    hour_key = now.strftime('%H:00')
+    analysis = result['analysis']
+    received_at = item['received_at']
+    hour_str = received_at.strftime('%H:%M')
+    hour_key = received_at.strftime('%H:00')
     
-    previous_data = storage.get_previous_hour_data(hour_key)
-    comparison = None
-    if previous_data:
-        comparison = analyzer.compare_with_previous(analysis, previous_data)
+    with trace.span('compare'):
+        previous_data = source.storage.get_previous_hour_data(hour_key)
+        comparison = None
+        if previous_data:
+            comparison = analyzer.compare_with_previous(analysis, previous_data)
     
     gaps_data = {cat: {'max_gap': data['max_gap'], 'gaps': data['gaps'], 'max_gap_pair': data.get('max_gap_pair')} 
                  for cat, data in analysis.items()}
-    storage.save_analysis(hour_key, gaps_data)
-    
-    bilan_msg = bot_logic.format_bilan(analysis, parsed_data['total_games'], hour_str, comparison)
-    
-    try:
-        await context.bot.send_message(
-            chat_id=DESTINATION_CHANNEL_ID,
-            text=bilan_msg, 
-            parse_mode='Markdown'
-        )
-        print(f"✅ Bilan envoyé vers {DESTINATION_CHANNEL_ID}")
-    except Exception as e:
-        print(f"❌ Erreur envoi vers {DESTINATION_CHANNEL_ID}: {e}")
+    with trace.span('save_analysis'):
+        source.storage.save_analysis(hour_key, gaps_data)
+    auto_scheduler.notify_new_data()
+    
+    results = await fanout.deliver(
+        lambda categories: source.bot_logic.format_bilan(
+            analysis, parsed_data['total_games'], hour_str, comparison, categories=categories
+        ),
+        PRIORITY_HIGH,
+        fanout.ids_for_source(source.id),
+        trace
+    )
+    sent = sum(1 for ok in results.values() if ok)
+    logger.info("✅ Bilan %s envoyé vers %d/%d destinations", source.id, sent, len(results),
+                extra={'source': source.id})
+    return result['status']
+
+def _message_superseded(item, reason):
+    """
+    Message retiré de la file sans être traité (remplacé par un plus récent
+    de la même heure, ou évincé quand la file est pleine) : sa trace s'arrête là
+    """
+    trace = item['trace']
+    trace.add_span('ingest_wait', item['queued_at'], time.perf_counter())
+    if reason == 'evicted':
+        trace.finish(status='evicted', error='file d\'ingestion pleine')
+    else:
+        trace.finish(status=reason)
+
+for _source in sources.values():
+    _source.attach_handler(process_channel_message, _message_superseded)
 
 # ============ SCHEDULER ============
 
-async def auto_send_scheduler(context: ContextTypes.DEFAULT_TYPE):
-    print(f"⏰ Scheduler démarré - Intervalle: {storage.get_interval_minutes()} min - Destination: {DESTINATION_CHANNEL_ID}")
-    
-    while True:
-        try:
-            if storage.is_auto_send_enabled():
-                last_send_str = storage.get_last_auto_send()
-                interval = storage.get_interval_minutes()
-                
-                should_send = False
-                
-                if not last_send_str:
-                    should_send = storage.get_last_parsed_data() is not None
-                else:
-                    try:
-                        last_send = datetime.fromisoformat(last_send_str)
-                        next_send = last_send + timedelta(minutes=interval)
-                        should_send = datetime.now() >= next_send
-                    except:
-                        should_send = True
-                
-                if should_send:
-                    await send_bilan_to_destination(context)
-            
-            await asyncio.sleep(60)
-            
-        except Exception as e:
-            print(f"❌ Erreur scheduler: {e}")
-            await asyncio.sleep(60)
+async def _send_scheduled_bilan(schedule_id):
+    """Envoi déclenché par le scheduler (échéance d'une destination atteinte)"""
+    results = await send_bilan_to_destinations([schedule_id])
+    return results.get(schedule_id, False)
+
+auto_scheduler = AutoSendScheduler(storage, _send_scheduled_bilan, fanout.ids(), fanout.intervals())
+
+async def auto_send_scheduler(application):
+    logger.info("⏰ Scheduler démarré - Intervalle: %s min - Destinations: %d",
+                storage.get_interval_minutes(), len(fanout.ids()))
+    await auto_scheduler.run()
 
 # ============ DÉMARRAGE ============
 
 def run_flask():
     app.run(host=HOST, port=PORT, threaded=True)
 
+def close_sources():
+    """Écrit les données en attente (écriture différée) et ferme le stockage de chaque source"""
+    for source in sources.values():
+        try:
+            source.close()
+        except Exception as e:
+            logger.error("❌ Fermeture de la source %s: %s", source.id, e)
+
 def main():
+    setup_logging()
     validation = validate_configuration()
     
     print("=" * 50)
@@ -678,7 +845,11 @@ def main():
     channels = get_channels_info()
     print(f"📺 Canaux configurés:")
     print(f"   Source:      {channels['source']}")
+    if len(channels['sources']) > 1:
+        print(f"   + {len(channels['sources']) - 1} autres sources")
     print(f"   Destination: {channels['destination']}")
+    if len(channels['destinations']) > 1:
+        print(f"   + {len(channels['destinations']) - 1} autres destinations")
     print(f"👤 Admin:       {ADMIN_ID}")
     print(f"🔐 API:         ID {API_ID} configurée")
     print()
@@ -691,7 +862,13 @@ def main():
     asyncio.run(run_bot())
 
 async def run_bot():
-    application = Application.builder().token(BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .base_url(TELEGRAM_BASE_URL)
+        .connection_pool_size(SEND_POOL_SIZE)
+        .build()
+    )
     
     # Commandes publiques
     application.add_handler(CommandHandler("start", start_command))
@@ -699,6 +876,7 @@ async def run_bot():
     application.add_handler(CommandHandler("verifier", verifier_command))
     application.add_handler(CommandHandler("test", test_command))
     application.add_handler(CommandHandler("historique", historique_command))
+    application.add_handler(CommandHandler("tendances", tendances_command))
     application.add_handler(CommandHandler("restart", restart_command))
     
     # Commandes admin
@@ -706,10 +884,11 @@ async def run_bot():
     application.add_handler(CommandHandler("auto", auto_command))
     application.add_handler(CommandHandler("envoyer", envoyer_command))
     application.add_handler(CommandHandler("testenvoi", testenvoi_command))
+    application.add_handler(CommandHandler("profil", profil_command))
     
     # Handler canal source
     application.add_handler(MessageHandler(
-        filters.Chat(chat_id=SOURCE_CHANNEL_ID) & filters.TEXT, 
+        filters.Chat(chat_id=list(sources_by_chat)) & filters.TEXT, 
         handle_channel_message
     ))
     
@@ -720,29 +899,45 @@ async def run_bot():
     print()
     
     await application.initialize()
+    dispatcher.start(application.bot)
     await application.start()
     await application.updater.start_polling(drop_pending_updates=True)
     
-    # Vérification initiale des canaux (silencieuse)
-    try:
-        await update_channel_status_cache(application.bot)
-    except Exception as e:
-        print(f"⚠️  Impossible de vérifier les canaux au démarrage: {e}")
+    if PROFILE_MESSAGES or PROFILE_SECONDS:
+        profiler.start(PROFILE_MESSAGES, PROFILE_SECONDS, _profile_finished(ADMIN_ID))
     
-    # Démarrer scheduler
+    # Démarrer scheduler, vérification des canaux et un consommateur de file d'ingestion par source
     scheduler_task = asyncio.create_task(auto_send_scheduler(application))
+    channel_status_task = asyncio.create_task(channel_status.run(application.bot))
+    ingest_tasks = [asyncio.create_task(source.ingest_queue.run()) for source in sources.values()]
+    
+    # SIGTERM (arrêt du service sur Render) et SIGINT : arrêt propre, les
+    # données en attente d'écriture sont sauvegardées par close_sources()
+    stop_requested = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop_requested.set)
     
     try:
-        while True:
-            await asyncio.sleep(3600)
-    except asyncio.CancelledError:
+        await stop_requested.wait()
+    finally:
         scheduler_task.cancel()
-        raise
+        channel_status_task.cancel()
+        for task in ingest_tasks:
+            task.cancel()
+        profiler.stop()
+        await application.updater.stop()
+        await dispatcher.stop()
+        await application.stop()
+        await application.shutdown()
 
 if __name__ == "__main__":
     try:
         main()
     except KeyboardInterrupt:
+        pass
+    finally:
         print("\n🛑 Arrêt...")
-        storage.save_data()
-        sys.exit(0)
+        close_sources()
+        tracer.close()
+    sys.exit(0)
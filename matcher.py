@@ -0,0 +1,79 @@
+"""
+Détection des en-têtes de catégories (une expression régulière compilée)
+"""
+import re
+from collections import namedtuple
+from config import CATEGORIES
+
+# Une clé recherchée dans le message, avec la catégorie et la stratégie
+# d'extraction auxquelles elle appartient
+HeaderKey = namedtuple('HeaderKey', ['category', 'strategy', 'pattern', 'key'])
+
+# Préfixe fixe des clés de chaque stratégie (None = pas de préfixe)
+STRATEGY_MARKERS = {
+    'liste': 'Liste des numéros - ',
+    'config': 'Configuration: ',
+    'fallback': None
+}
+
+
+def build_header_keys(categories):
+    """Construit toutes les clés d'en-tête à partir de CATEGORIES"""
+    keys = []
+    for category_name, config in categories.items():
+        for pattern in config['patterns']:
+            for strategy, marker in STRATEGY_MARKERS.items():
+                key = f'{marker}{pattern}' if marker else pattern
+                keys.append(HeaderKey(category_name, strategy, pattern, key))
+    return keys
+
+
+class HeaderMatcher:
+    """
+    Expression régulière compilée une seule fois à partir des catégories :
+    une alternative par clé, les plus longues d'abord. La recherche se fait
+    dans le moteur re (en C) et saute les positions dont le premier
+    caractère ne commence aucune clé : une ligne sans en-tête coûte un seul
+    search(), quel que soit le nombre de catégories et de patterns.
+    """
+
+    def __init__(self, categories):
+        self.keys = build_header_keys(categories)
+        by_text = {}
+        for header in self.keys:
+            by_text.setdefault(header.key, []).append(header)
+        texts = sorted(by_text, key=len, reverse=True)
+        # À une position donnée seule la plus longue clé est rapportée :
+        # on y ajoute les clés qui en sont un préfixe
+        self._hits = {
+            text: [header for other in texts if text.startswith(other) for header in by_text[other]]
+            for text in texts
+        }
+        self._search = re.compile('|'.join(re.escape(text) for text in texts)).search
+
+    def find(self, line):
+        """Retourne toutes les clés présentes dans la ligne"""
+        hits = []
+        search = self._search
+        match = search(line)
+        while match:
+            hits.extend(self._hits[match.group()])
+            # Reprise au caractère suivant : les clés qui se chevauchent sont trouvées
+            match = search(line, match.start() + 1)
+        return hits
+
+    def headers_in(self, line, has_number):
+        """
+        Clés d'en-tête valides pour une ligne du message.
+        Les clés 'fallback' ne comptent que sur une ligne sans #N ; une ligne
+        de numéros n'est donc parcourue que si elle contient un préfixe
+        'Liste des numéros - ' ou 'Configuration: '.
+        """
+        if has_number:
+            if not any(marker in line for marker in STRATEGY_MARKERS.values() if marker):
+                return []
+            return [header for header in self.find(line) if header.strategy != 'fallback']
+        return self.find(line)
+
+
+HEADER_MATCHER = HeaderMatcher(CATEGORIES)
@@ -2,55 +2,143 @@
 Parseur de messages Telegram
 """
 import re
-from config import CATEGORIES
+import time
+from config import CATEGORIES, PARSER_MODE
+from matcher import HEADER_MATCHER, HeaderMatcher, STRATEGY_MARKERS
+from log import get_logger
+from metrics import PARSE_SECONDS, PARSE_RESULTS, PARSE_MISSING
+
+logger = get_logger('parser')
+
+_NUMBER_RE = re.compile(r'#N(\d+)')
+_WORD_RE = re.compile(r'\w')
+_SEPARATOR_CHARS = frozenset('━─—-=*│┃')
+
+
+class SectionIndex:
+    """
+    Index des lignes d'un message, construit en un seul passage.
+
+    Chaque ligne est classée une fois (séparateur, délimiteur majeur, début
+    de bloc ┏/╔, en-tête "Liste des numéros", numéros #N...), et la première
+    occurrence de chaque en-tête de catégorie est mémorisée par stratégie :
+    - 'liste'    : "Liste des numéros - PATTERN"
+    - 'config'   : "Configuration: PATTERN"
+    - 'fallback' : PATTERN seul, sur une ligne sans #N
+    """
+
+    def __init__(self, lines, matcher, is_separator, is_major):
+        self.lines = lines
+        count = len(lines)
+        self.skip = [False] * count
+        self.major = [False] * count
+        self.block = [False] * count
+        self.heavy_block = [False] * count
+        self.liste = [False] * count
+        self.list_start = [False] * count
+        self.text_line = [False] * count
+        self.numbers = [None] * count
+        self.headers = {strategy: {} for strategy in STRATEGY_MARKERS}
+
+        for i, line in enumerate(lines):
+            stripped = line.strip()
+            has_number = '#N' in line
+
+            for header in matcher.headers_in(line, has_number):
+                self.headers[header.strategy].setdefault(header.key, i)
+
+            if not stripped or (stripped[0] in _SEPARATOR_CHARS and is_separator(line)):
+                self.skip[i] = True
+                continue
+
+            self.major[i] = is_major(line)
+            self.heavy_block[i] = stripped.startswith('┏')
+            self.block[i] = self.heavy_block[i] or stripped.startswith('╔')
+            self.liste[i] = 'Liste des numéros' in line
+            self.list_start[i] = 'liste des numéros' in line.lower()
+
+            nums = _NUMBER_RE.findall(line) if has_number else None
+            if nums:
+                self.numbers[i] = [int(n) for n in nums]
+            elif _WORD_RE.search(stripped) and not any(c in stripped for c in ['#', '─', '━', '-']):
+                self.text_line[i] = True
 
 
 class MessageParser:
-    def __init__(self):
-        self.required_categories = list(CATEGORIES.keys())
+    def __init__(self, mode=PARSER_MODE, categories=None):
+        """categories : noms des catégories à extraire (None = toutes)"""
+        if categories is None:
+            self.categories = CATEGORIES
+            self.matcher = HEADER_MATCHER
+        else:
+            self.categories = {name: CATEGORIES[name] for name in categories}
+            self.matcher = HeaderMatcher(self.categories)
+        self.required_categories = list(self.categories.keys())
+        self.mode = mode
 
     def parse_message(self, text):
         """
         Parse un message complet et extrait toutes les catégories
         Mode permissif: accepte si catégories essentielles présentes
         """
+        start = time.perf_counter()
+        result, missing_categories = self.parse_with_report(text)
+        self.record_metrics(result, missing_categories, time.perf_counter() - start)
+        return result
+
+    def record_metrics(self, result, missing_categories, seconds):
+        """Durée, résultat et catégories manquantes d'un parsing"""
+        PARSE_SECONDS.observe(seconds)
+        PARSE_RESULTS.inc(result='accepted' if result else 'rejected')
+        for category_name in missing_categories:
+            PARSE_MISSING.inc(category=category_name)
+
+    def parse_with_report(self, text):
+        """Comme parse_message, sans métriques : retourne (résultat, catégories manquantes)"""
         if not text or 'STATISTIQUES COMPLÈTES' not in text:
-            print("⚠️ Message ne contient pas 'STATISTIQUES COMPLÈTES'")
-            return None
+            logger.warning("⚠️ Message ne contient pas 'STATISTIQUES COMPLÈTES'")
+            return None, []
 
         result = {
             'total_games': self.extract_total_games(text),
             'categories': {}
         }
 
-        print(f"📊 Total jeux trouvés: {result['total_games']}")
+        logger.debug("📊 Total jeux trouvés: %d", result['total_games'])
 
         found_categories = 0
         missing_categories = []
 
-        for category_name, config in CATEGORIES.items():
-            numbers = self.extract_category_numbers(text, category_name, config['patterns'])
+        index = self.build_section_index(text) if self.mode == 'index' else None
+
+        for category_name, config in self.categories.items():
+            if index is not None:
+                numbers = self.extract_from_index(index, config['patterns'])
+            else:
+                numbers = self.extract_category_numbers(text, category_name, config['patterns'])
             if numbers:
                 result['categories'][category_name] = numbers
                 found_categories += 1
-                print(f"✅ {category_name}: {len(numbers)} numéros trouvés")
+                logger.debug("✅ %s: %d numéros trouvés", category_name, len(numbers))
             else:
                 missing_categories.append(category_name)
-                print(f"⚠️ Catégorie manquante: {category_name}")
+                logger.info("⚠️ Catégorie manquante: %s", category_name)
 
-        print(f"📈 Résumé: {found_categories}/{len(CATEGORIES)} catégories trouvées")
+        logger.info("📈 Résumé: %d/%d catégories trouvées", found_categories, len(self.categories),
+                    extra={'found': found_categories, 'total_games': result['total_games']})
 
-        essential_categories = ['Victoire Joueur', 'Victoire Banquier', 'Pair', 'Impair']
+        essential_categories = [cat for cat in ['Victoire Joueur', 'Victoire Banquier', 'Pair', 'Impair']
+                                if cat in self.categories]
         has_essential = all(cat in result['categories'] for cat in essential_categories)
 
-        if not has_essential:
-            print(f"❌ Catégories essentielles manquantes")
-            return None
+        if not has_essential or not result['categories']:
+            logger.warning("❌ Catégories essentielles manquantes")
+            return None, missing_categories
 
-        if found_categories < len(CATEGORIES):
-            print(f"⚠️ Mode permissif: {found_categories} catégories acceptées")
+        if found_categories < len(self.categories):
+            logger.info("⚠️ Mode permissif: %d catégories acceptées", found_categories)
 
-        return result
+        return result, missing_categories
 
     def extract_total_games(self, text):
         """Extrait le nombre total de jeux"""
@@ -83,6 +171,93 @@ class MessageParser:
             return True
         return False
 
+    def build_section_index(self, text):
+        """Découpe le message une seule fois et indexe ses sections"""
+        return SectionIndex(text.split('\n'), self.matcher,
+                            self._is_separator, self._is_major_section_boundary)
+
+    def extract_from_index(self, index, patterns):
+        """
+        Équivalent de extract_category_numbers, mais à partir de l'index :
+        les en-têtes sont déjà localisés et chaque ligne déjà classée, seule
+        la section de la catégorie est parcourue.
+        """
+        for pattern in patterns:
+            key = f'Liste des numéros - {pattern}'
+            start = index.headers['liste'].get(key)
+            if start is not None:
+                numbers = self._collect_after_header(index, start, key)
+                return numbers if numbers else None
+
+        for pattern in patterns:
+            start = index.headers['config'].get(f'Configuration: {pattern}')
+            if start is not None:
+                numbers = self._collect_after_config_header(index, start)
+                if numbers is not None:
+                    return numbers if numbers else None
+
+        for pattern in patterns:
+            start = index.headers['fallback'].get(pattern)
+            if start is not None:
+                numbers = self._collect_fallback(index, start)
+                if numbers:
+                    return numbers
+
+        return None
+
+    def _collect_after_header(self, index, start, header_text):
+        """Voir _extract_after_header"""
+        numbers = []
+        for i in range(start + 1, len(index.lines)):
+            if index.skip[i]:
+                continue
+            if index.major[i]:
+                break
+            if index.liste[i] and header_text not in index.lines[i]:
+                break
+            if index.block[i]:
+                break
+            if index.numbers[i]:
+                numbers.extend(index.numbers[i])
+        return numbers
+
+    def _collect_after_config_header(self, index, start):
+        """Voir _extract_after_config_header"""
+        in_list = False
+        numbers = []
+        for i in range(start + 1, len(index.lines)):
+            if not in_list:
+                if index.list_start[i]:
+                    in_list = True
+                elif index.block[i]:
+                    break
+                continue
+
+            if index.skip[i]:
+                continue
+            if index.block[i] or index.major[i]:
+                break
+            if index.numbers[i]:
+                numbers.extend(index.numbers[i])
+            elif index.text_line[i]:
+                break
+
+        return numbers if in_list else None
+
+    def _collect_fallback(self, index, start):
+        """Voir _extract_fallback"""
+        numbers = []
+        for i in range(start + 1, len(index.lines)):
+            if index.skip[i]:
+                continue
+            if index.major[i]:
+                break
+            if index.liste[i] or index.heavy_block[i]:
+                break
+            if index.numbers[i]:
+                numbers.extend(index.numbers[i])
+        return numbers if numbers else None
+
     def extract_category_numbers(self, text, category_name, patterns):
         """
         Extrait les numéros (#NXXXX) pour une catégorie.
@@ -133,7 +308,7 @@ class MessageParser:
             if not in_section:
                 if header_text in line:
                     in_section = True
-                    print(f"   🔍 Header trouvé: '{header_text}' à ligne {i}")
+                    logger.debug("🔍 Header trouvé: '%s' à ligne %d", header_text, i)
                 continue
 
             # On est dans la section
@@ -145,17 +320,17 @@ class MessageParser:
 
             # Séparateur majeur ━━━━ → fin du bloc
             if self._is_major_section_boundary(line):
-                print(f"   🏁 Fin section (━━━ majeur) à ligne {i}")
+                logger.debug("🏁 Fin section (━━━ majeur) à ligne %d", i)
                 break
 
             # Nouveau header "Liste des numéros" d'une autre catégorie → fin
             if 'Liste des numéros' in line and header_text not in line:
-                print(f"   🏁 Fin section (nouvelle liste) à ligne {i}")
+                logger.debug("🏁 Fin section (nouvelle liste) à ligne %d", i)
                 break
 
             # Nouveau header de bloc paire (┏━━━) → fin
             if line.strip().startswith('┏') or line.strip().startswith('╔'):
-                print(f"   🏁 Fin section (nouveau bloc) à ligne {i}")
+                logger.debug("🏁 Fin section (nouveau bloc) à ligne %d", i)
                 break
 
             # Extraire les numéros
@@ -181,17 +356,17 @@ class MessageParser:
             if not found_config:
                 if config_text in line:
                     found_config = True
-                    print(f"   🔍 Config trouvée: '{config_text}' à ligne {i}")
+                    logger.debug("🔍 Config trouvée: '%s' à ligne %d", config_text, i)
                 continue
 
             if not in_list:
                 if 'La liste des numéros' in line or 'liste des numéros' in line.lower():
                     in_list = True
-                    print(f"   📋 Début liste numéros à ligne {i}")
+                    logger.debug("📋 Début liste numéros à ligne %d", i)
                     continue
                 # Si on arrive à un nouveau bloc ┏ avant de trouver la liste → abandon
                 if line.strip().startswith('┏') or line.strip().startswith('╔'):
-                    print(f"   ⚠️ Nouveau bloc avant liste à ligne {i}")
+                    logger.debug("⚠️ Nouveau bloc avant liste à ligne %d", i)
                     break
                 continue
 
@@ -203,11 +378,11 @@ class MessageParser:
 
             # Un nouveau bloc commence → fin
             if line.strip().startswith('┏') or line.strip().startswith('╔'):
-                print(f"   🏁 Fin liste (nouveau bloc) à ligne {i}")
+                logger.debug("🏁 Fin liste (nouveau bloc) à ligne %d", i)
                 break
 
             if self._is_major_section_boundary(line):
-                print(f"   🏁 Fin liste (━━━ majeur) à ligne {i}")
+                logger.debug("🏁 Fin liste (━━━ majeur) à ligne %d", i)
                 break
 
             nums = re.findall(r'#N(\d+)', line)
@@ -0,0 +1,143 @@
+"""
+Chaîne de traitement d'un message source : parsing puis analyse
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from cache import LRUCache, content_hash
+from config import CATEGORIES
+
+STATUS_PROCESSED = 'processed'
+STATUS_DUPLICATE = 'duplicate'
+STATUS_IGNORED = 'ignored'
+STATUS_FAILED = 'failed'
+
+# Parseurs propres à chaque processus du pool (mode 'process'),
+# un par configuration (mode, catégories)
+_worker_parsers = {}
+
+
+def parse_in_worker(text, mode=None, categories=None):
+    """
+    Parse un message dans un processus du pool.
+    Retourne (résultat, catégories manquantes, durée) : les métriques sont
+    enregistrées dans le processus principal.
+    """
+    key = (mode, categories)
+    parser = _worker_parsers.get(key)
+    if parser is None:
+        from parser import MessageParser
+        from config import PARSER_MODE
+        from log import setup_worker_logging
+        if not _worker_parsers:
+            setup_worker_logging()
+        parser = MessageParser(mode or PARSER_MODE, categories)
+        _worker_parsers[key] = parser
+    start = time.perf_counter()
+    result, missing_categories = parser.parse_with_report(text)
+    return result, missing_categories, time.perf_counter() - start
+
+
+def create_executor(mode, workers):
+    """Pool d'exécution pour WORKER_MODE ('inline' → None, 'thread', 'process')"""
+    if mode == 'thread':
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pipeline')
+    if mode == 'process':
+        return ProcessPoolExecutor(max_workers=workers)
+    return None
+
+
+class MessagePipeline:
+    """
+    Parse et analyse un message "STATISTIQUES COMPLÈTES".
+    Les résultats sont mis en cache par empreinte du texte : un message
+    identique à un message déjà traité ressort avec le statut 'duplicate'
+    sans être re-parsé ni ré-analysé.
+
+    Avec un executor, process_async exécute le travail hors de la boucle
+    asyncio (au plus max_inflight messages à la fois) :
+    - ThreadPoolExecutor : parsing et analyse dans un thread du pool
+    - ProcessPoolExecutor : parsing dans un processus du pool, l'analyse
+      (incrémentale, donc proportionnelle aux nouveaux numéros) reste dans
+      le processus principal où vit son état
+    Pendant une session de profilage (profiler.active), tout est traité en
+    ligne pour que cProfile voie le parsing et l'analyse.
+    """
+
+    def __init__(self, parser, analyzer, cache=None, executor=None, max_inflight=4, profiler=None):
+        self.parser = parser
+        self.analyzer = analyzer
+        self.cache = cache if cache is not None else LRUCache()
+        self.executor = executor
+        self.profiler = profiler
+        self._inflight = asyncio.Semaphore(max_inflight)
+        self._analyze_lock = threading.Lock()
+
+    def process(self, text):
+        """
+        Retourne un dict {'status', 'digest', 'parsed', 'analysis', 'timings'}
+        status: 'processed', 'duplicate', 'ignored' ou 'failed'
+        timings: {'parse'|'analyze': (début, fin)} en time.perf_counter
+        """
+        result = self._lookup(text)
+        if result['status'] is not None:
+            return result
+        start = time.perf_counter()
+        parsed = self.parser.parse_message(text)
+        return self._analyze(result['digest'], parsed, {'parse': (start, time.perf_counter())})
+
+    async def process_async(self, text):
+        """Comme process, mais hors de la boucle asyncio si un executor est configuré"""
+        if self.executor is None or (self.profiler is not None and self.profiler.active):
+            return self.process(text)
+
+        async with self._inflight:
+            loop = asyncio.get_running_loop()
+            if isinstance(self.executor, ProcessPoolExecutor):
+                result = self._lookup(text)
+                if result['status'] is not None:
+                    return result
+                categories = None
+                if self.parser.categories is not CATEGORIES:
+                    categories = tuple(self.parser.categories)
+                start = time.perf_counter()
+                parsed, missing_categories, seconds = await loop.run_in_executor(
+                    self.executor, parse_in_worker, text, self.parser.mode, categories
+                )
+                self.parser.record_metrics(parsed, missing_categories, seconds)
+                # Le span de parsing inclut l'attente du pool et le transfert
+                return self._analyze(result['digest'], parsed, {'parse': (start, time.perf_counter())})
+            return await loop.run_in_executor(self.executor, self.process, text)
+
+    def _lookup(self, text):
+        """Filtre les messages ignorés et les doublons ; status None = à traiter"""
+        if not text or 'STATISTIQUES COMPLÈTES' not in text:
+            return {'status': STATUS_IGNORED, 'digest': None, 'parsed': None, 'analysis': None, 'timings': {}}
+
+        digest = content_hash(text)
+        cached = self.cache.get(digest)
+        if cached is not None:
+            parsed, analysis = cached
+            return {'status': STATUS_DUPLICATE, 'digest': digest, 'parsed': parsed, 'analysis': analysis,
+                    'timings': {}}
+
+        return {'status': None, 'digest': digest, 'parsed': None, 'analysis': None, 'timings': {}}
+
+    def _analyze(self, digest, parsed, timings):
+        if not parsed:
+            return {'status': STATUS_FAILED, 'digest': digest, 'parsed': None, 'analysis': None,
+                    'timings': timings}
+
+        # L'analyseur incrémental a un état : un seul message à la fois
+        with self._analyze_lock:
+            start = time.perf_counter()
+            analysis = self.analyzer.analyze_all_categories(parsed)
+            timings['analyze'] = (start, time.perf_counter())
+        self.cache.put(digest, (parsed, analysis))
+        return {'status': STATUS_PROCESSED, 'digest': digest, 'parsed': parsed, 'analysis': analysis,
+                'timings': timings}
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,164 @@
+"""
+Profilage à la demande : cProfile et tracemalloc sur N messages ou une durée
+"""
+import asyncio
+import cProfile
+import os
+import pstats
+import time
+import tracemalloc
+from datetime import datetime
+from config import PROFILE_DIR, PROFILE_TOP_N, PROFILE_TRACEMALLOC_FRAMES
+from log import get_logger
+
+logger = get_logger('profiling')
+
+# Le résumé ne liste que le code du bot ; le fichier pstats contient tout
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class Profiler:
+    """
+    Une session de profilage à la fois, dans le thread de la boucle asyncio :
+    cProfile couvre les handlers (handle_channel_message, file d'ingestion,
+    envois) et, la pipeline traitant les messages en ligne pendant la
+    session, le parsing et l'analyse. tracemalloc suit les allocations.
+    Hors session, les points d'accroche se limitent à tester `active`.
+    """
+
+    def __init__(self, output_dir=PROFILE_DIR, top_n=PROFILE_TOP_N, frames=PROFILE_TRACEMALLOC_FRAMES):
+        self.output_dir = output_dir
+        self.top_n = top_n
+        self.frames = frames
+        self.active = False
+        self.last_report = None
+        self._profile = None
+        self._baseline = None
+        self._own_tracemalloc = False
+        self._timer = None
+        self._on_finish = None
+        self._messages_left = None
+        self._messages = 0
+        self._started_at = None
+        self._start = None
+
+    def start(self, messages=None, seconds=None, on_finish=None):
+        """
+        Démarre une session de `messages` messages et/ou `seconds` secondes
+        (la première limite atteinte l'arrête). on_finish(rapport) est
+        appelé quand la session s'arrête d'elle-même.
+        """
+        if self.active:
+            raise RuntimeError("Un profilage est déjà en cours")
+        if not messages and not seconds:
+            raise ValueError("Nombre de messages ou durée requis")
+
+        self._own_tracemalloc = not tracemalloc.is_tracing()
+        if self._own_tracemalloc:
+            tracemalloc.start(self.frames)
+        self._baseline = tracemalloc.take_snapshot()
+        self._messages_left = messages or None
+        self._messages = 0
+        self._on_finish = on_finish
+        if seconds:
+            self._timer = asyncio.get_running_loop().call_later(seconds, self._finish)
+        self._started_at = datetime.now()
+        self._start = time.perf_counter()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        self.active = True
+        logger.info("🔬 Profilage démarré (messages: %s, secondes: %s)", messages or '-', seconds or '-')
+
+    def message_done(self):
+        """À appeler après chaque message source traité pendant une session"""
+        self._messages += 1
+        if self._messages_left is not None and self._messages >= self._messages_left:
+            self._finish()
+
+    def _finish(self):
+        if not self.active:
+            return
+        report = self.stop()
+        if self._on_finish is not None:
+            self._on_finish(report)
+
+    def stop(self):
+        """Arrête la session, écrit pstats et snapshot ; retourne le rapport"""
+        if not self.active:
+            return None
+        self._profile.disable()
+        self.active = False
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        snapshot = tracemalloc.take_snapshot()
+        if self._own_tracemalloc:
+            tracemalloc.stop()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = self._started_at.strftime('%Y%m%d_%H%M%S')
+        pstats_file = os.path.join(self.output_dir, f"profile_{stamp}.pstats")
+        snapshot_file = os.path.join(self.output_dir, f"alloc_{stamp}.snapshot")
+        stats = pstats.Stats(self._profile)
+        stats.dump_stats(pstats_file)
+        snapshot.dump(snapshot_file)
+
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        allocations = snapshot.filter_traces(filters).compare_to(
+            self._baseline.filter_traces(filters), 'lineno'
+        )
+        self.last_report = {
+            'started_at': self._started_at.isoformat(timespec='seconds'),
+            'duration': round(time.perf_counter() - self._start, 1),
+            'messages': self._messages,
+            'pstats_file': pstats_file,
+            'snapshot_file': snapshot_file,
+            'hotspots': self._hotspots(stats),
+            'allocations': [
+                {'where': str(stat.traceback[0]), 'size_kib': round(stat.size_diff / 1024, 1),
+                 'count': stat.count_diff}
+                for stat in allocations[:self.top_n]
+            ]
+        }
+        self._profile = None
+        self._baseline = None
+        logger.info("🔬 Profilage terminé : %s, %s", pstats_file, snapshot_file)
+        return self.last_report
+
+    def _hotspots(self, stats):
+        """Top-N des fonctions du bot par temps cumulé"""
+        entries = sorted(
+            (item for item in stats.stats.items() if item[0][0].startswith(_PROJECT_DIR)),
+            key=lambda item: item[1][3], reverse=True
+        )
+        return [
+            {'function': f"{func} ({os.path.basename(filename)}:{line})",
+             'calls': calls, 'own_ms': round(own * 1000, 1), 'cumulative_ms': round(cumulative * 1000, 1)}
+            for (filename, line, func), (_, calls, own, cumulative, _) in entries[:self.top_n]
+        ]
+
+    def status(self):
+        if not self.active:
+            return {'active': False, 'last_report': self.last_report and self.last_report['pstats_file']}
+        return {
+            'active': True,
+            'elapsed': round(time.perf_counter() - self._start, 1),
+            'messages': self._messages,
+            'messages_limit': self._messages_left
+        }
+
+
+def format_report(report):
+    """Résumé texte d'un rapport (sans Markdown : chemins et noms de fonctions)"""
+    lines = [
+        f"🔬 Profilage : {report['messages']} messages en {report['duration']} s",
+        "",
+        "⏱️ Fonctions (temps cumulé / propre, appels) :"
+    ]
+    for entry in report['hotspots']:
+        lines.append(f"• {entry['cumulative_ms']} / {entry['own_ms']} ms, {entry['calls']}× — {entry['function']}")
+    lines += ["", "🧠 Allocations (KiB, nombre) :"]
+    for entry in report['allocations']:
+        lines.append(f"• {entry['size_kib']} KiB, {entry['count']}× — {entry['where']}")
+    lines += ["", f"📄 {report['pstats_file']}", f"📄 {report['snapshot_file']}"]
+    return '\n'.join(lines)
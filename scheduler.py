@@ -0,0 +1,167 @@
+"""
+Planificateur d'envoi automatique à échéances exactes
+"""
+import asyncio
+import heapq
+import itertools
+from datetime import datetime, timedelta
+from config import SCHEDULER_RETRY_SECONDS
+from log import get_logger
+from metrics import SCHEDULER_RUNS, SCHEDULER_LAG_SECONDS, SCHEDULER_SEND_SECONDS
+
+logger = get_logger('scheduler')
+
+
+class AutoSendScheduler:
+    """
+    Calcule la prochaine échéance de chaque planification et dort
+    exactement jusqu'à la plus proche (tas de minuteurs). Les réglages
+    sont relus dans le stockage seulement quand on réarme : /intervalle,
+    /auto, envoi forcé ou arrivée de nouvelles données.
+
+    Une planification par destination : `intervals` donne l'intervalle
+    propre de chacune en minutes (None = intervalle global). Les
+    planifications arrivées à échéance ensemble sont envoyées en parallèle.
+
+    send_fn(schedule_id) est une coroutine qui retourne True si l'envoi a
+    réussi ; en cas d'échec on réessaie après SCHEDULER_RETRY_SECONDS.
+    """
+
+    def __init__(self, storage, send_fn, schedule_ids=('destination',), intervals=None):
+        self.storage = storage
+        self.send_fn = send_fn
+        self.schedule_ids = list(schedule_ids)
+        self.intervals = intervals or {}
+        self._heap = []
+        self._generation = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._enabled = False
+        self._intervals = {}
+        self._last_send = {}
+        self._has_data = False
+
+    # ============ RÉARMEMENT ============
+
+    def rearm(self):
+        """Relit les réglages et recalcule toutes les échéances"""
+        self._enabled = self.storage.is_auto_send_enabled()
+        global_interval = self.storage.get_interval_minutes()
+        self._has_data = self.storage.get_last_parsed_data() is not None
+        for schedule_id in self.schedule_ids:
+            minutes = self.intervals.get(schedule_id) or global_interval
+            self._intervals[schedule_id] = timedelta(minutes=minutes)
+            last_send = self.storage.get_last_auto_send(schedule_id)
+            self._last_send[schedule_id] = self._parse_timestamp(last_send)
+            self._arm(schedule_id, self._deadline_for(schedule_id))
+        self._wakeup.set()
+
+    def notify_new_data(self):
+        """De nouvelles données sont disponibles (envoi en attente de données)"""
+        if not self._has_data:
+            self._has_data = True
+            for schedule_id in self.schedule_ids:
+                self._arm(schedule_id, self._deadline_for(schedule_id))
+            self._wakeup.set()
+
+    def next_deadline(self):
+        """Prochaine échéance valide (datetime) ou None"""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def _parse_timestamp(self, value):
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            # Horodatage illisible : on considère l'envoi comme dû
+            return datetime.min
+
+    def _deadline_for(self, schedule_id):
+        if not self._enabled:
+            return None
+        last_send = self._last_send.get(schedule_id)
+        if last_send is None:
+            return datetime.now() if self._has_data else None
+        if last_send == datetime.min:
+            return datetime.now()
+        return last_send + self._intervals[schedule_id]
+
+    def _arm(self, schedule_id, deadline):
+        generation = self._generation.get(schedule_id, 0) + 1
+        self._generation[schedule_id] = generation
+        if deadline is not None:
+            heapq.heappush(self._heap, (deadline, next(self._counter), schedule_id, generation))
+
+    def _drop_stale(self):
+        while self._heap and self._heap[0][3] != self._generation.get(self._heap[0][2]):
+            heapq.heappop(self._heap)
+
+    # ============ BOUCLE ============
+
+    async def run(self):
+        needs_rearm = True
+        while True:
+            try:
+                if needs_rearm:
+                    self.rearm()
+                    needs_rearm = False
+                await self._run_once()
+            except Exception:
+                # La boucle ne doit jamais s'arrêter : pause, puis échéances
+                # recalculées (celles déjà retirées du tas sont réarmées)
+                logger.exception("❌ Erreur boucle scheduler, reprise dans %ss", SCHEDULER_RETRY_SECONDS)
+                needs_rearm = True
+                await asyncio.sleep(SCHEDULER_RETRY_SECONDS)
+
+    async def _run_once(self):
+        """Attend la prochaine échéance (ou un réarmement) et envoie ce qui est dû"""
+        self._wakeup.clear()
+        deadline = self.next_deadline()
+
+        if deadline is None:
+            await self._wakeup.wait()
+            return
+
+        delay = (deadline - datetime.now()).total_seconds()
+        if delay > 0:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                return  # réarmé avant l'échéance
+            except asyncio.TimeoutError:
+                pass
+
+        woke_at = datetime.now()
+        due = self._pop_due(woke_at)
+        if not due:
+            return
+        SCHEDULER_LAG_SECONDS.observe(max(0.0, (woke_at - deadline).total_seconds()))
+
+        with SCHEDULER_SEND_SECONDS.time():
+            results = await asyncio.gather(
+                *(self.send_fn(schedule_id) for schedule_id in due),
+                return_exceptions=True
+            )
+
+        now = datetime.now()
+        for schedule_id, sent in zip(due, results):
+            if isinstance(sent, Exception):
+                logger.error("❌ Erreur scheduler (%s): %s", schedule_id, sent)
+                sent = False
+            SCHEDULER_RUNS.inc(result='sent' if sent else 'failed')
+            if sent:
+                self._last_send[schedule_id] = now
+                self._arm(schedule_id, now + self._intervals[schedule_id])
+            else:
+                self._arm(schedule_id, now + timedelta(seconds=SCHEDULER_RETRY_SECONDS))
+
+    def _pop_due(self, now):
+        """Retire du tas toutes les planifications valides arrivées à échéance"""
+        due = []
+        self._drop_stale()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, schedule_id, _ = heapq.heappop(self._heap)
+            due.append(schedule_id)
+            self._drop_stale()
+        return due
@@ -0,0 +1,107 @@
+"""
+Canaux source : une chaîne de traitement indépendante par table de jeu
+"""
+import os
+from functools import partial
+from config import (
+    DATA_FILE, SQLITE_FILE, HISTORY_DIR, STORAGE_BACKEND, PARSER_MODE,
+    MESSAGE_CACHE_SIZE, MESSAGE_CACHE_TTL, WORKER_MODE, WORKER_COUNT, MAX_INFLIGHT_JOBS,
+    INGEST_QUEUE_SIZE
+)
+from storage import create_storage
+from parser import MessageParser
+from analyzer import IncrementalGapAnalyzer
+from cache import LRUCache
+from pipeline import MessagePipeline, create_executor
+from ingest import IngestQueue
+from bot import BotLogic
+from metrics import STORAGE_FILE_BYTES
+
+
+def _file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else None
+
+
+def source_path(path, source_id, primary):
+    """Fichier propre à une source : la source principale garde le nom d'origine"""
+    if primary or not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}_{source_id}{ext}"
+
+
+class SourceChannel:
+    """
+    Tout ce qui concerne un canal source : parseur (catégories, mode),
+    analyseur incrémental, cache, pool d'exécution, stockage (fichiers
+    suffixés par l'id) et file d'ingestion. Rien n'est partagé entre deux
+    sources, hormis le dispatcher d'envoi : une source lente ou chargée ne
+    bloque pas les autres.
+    """
+
+    def __init__(self, config, primary=False, labelled=False, profiler=None):
+        self.id = config['id']
+        self.chat_id = config['chat_id']
+        self.label = config.get('label') or self.id
+        self.primary = primary
+        self.debug_file = source_path('last_message_debug.txt', self.id, primary)
+
+        history_dir = HISTORY_DIR
+        if history_dir and not primary:
+            history_dir = os.path.join(history_dir, self.id)
+        self.storage = create_storage(
+            STORAGE_BACKEND,
+            source_path(DATA_FILE, self.id, primary),
+            sqlite_file=source_path(SQLITE_FILE, self.id, primary),
+            history_dir=history_dir
+        )
+        self.parser = MessageParser(config.get('parser_mode') or PARSER_MODE, config.get('categories'))
+        self.pipeline = MessagePipeline(
+            self.parser, IncrementalGapAnalyzer(),
+            LRUCache(MESSAGE_CACHE_SIZE, MESSAGE_CACHE_TTL or None),
+            executor=create_executor(WORKER_MODE, WORKER_COUNT),
+            max_inflight=MAX_INFLIGHT_JOBS,
+            profiler=profiler
+        )
+        self.bot_logic = BotLogic(self.storage, self.label if labelled else None)
+        self.ingest_queue = None
+        for name, path in self.storage_files().items():
+            STORAGE_FILE_BYTES.set_function(partial(_file_size, path), source=self.id, file=name)
+
+    def storage_files(self):
+        """Fichiers du stockage de la source ({nom: chemin})"""
+        if hasattr(self.storage, 'db_file'):
+            return {'db': self.storage.db_file, 'wal': f"{self.storage.db_file}-wal"}
+        files = {'data': self.storage.data_file}
+        if hasattr(self.storage, 'journal_file'):
+            files['journal'] = self.storage.journal_file
+        return files
+
+    def attach_handler(self, handler, on_superseded=None):
+        """
+        Crée la file d'ingestion ; handler(source, item) traite un message,
+        on_superseded(item, reason) est appelé pour un message retiré de la
+        file sans être traité (reason : 'coalesced' ou 'evicted')
+        """
+        self.ingest_queue = IngestQueue(partial(handler, self), INGEST_QUEUE_SIZE, on_superseded)
+
+    def stats(self):
+        return {
+            'chat_id': self.chat_id,
+            'label': self.label,
+            'message_cache': self.pipeline.cache.stats(),
+            'ingest_queue': self.ingest_queue.stats() if self.ingest_queue else None
+        }
+
+    def close(self):
+        self.pipeline.close()
+        self.storage.close()
+
+
+def create_sources(configs, profiler=None):
+    """{id: SourceChannel} dans l'ordre de configuration (la première est principale)"""
+    labelled = len(configs) > 1
+    return {
+        config['id']: SourceChannel(config, primary=(i == 0), labelled=labelled, profiler=profiler)
+        for i, config in enumerate(configs)
+    }
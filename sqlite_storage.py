@@ -0,0 +1,298 @@
+"""
+Stockage SQLite des écarts (même interface publique que storage.Storage)
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from config import SQLITE_FILE, HISTORY_DIR, get_current_journee, DEFAULT_INTERVAL_MINUTES
+from codec import pack_ints, unpack_ints
+from storage import ChangeNotifier, create_storage, last_auto_send_key
+from metrics import STORAGE_WRITE_SECONDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS config (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS analyses (
+    journee TEXT NOT NULL,
+    hour TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    PRIMARY KEY (journee, hour)
+);
+CREATE TABLE IF NOT EXISTS gaps (
+    journee TEXT NOT NULL,
+    hour TEXT NOT NULL,
+    category TEXT NOT NULL,
+    max_gap INTEGER,
+    max_gap_pair TEXT,
+    gaps TEXT,
+    PRIMARY KEY (journee, hour, category)
+);
+CREATE INDEX IF NOT EXISTS idx_gaps_category_journee ON gaps (category, journee);
+"""
+
+DEFAULT_CONFIG = {
+    'last_analysis': None,
+    'interval_minutes': DEFAULT_INTERVAL_MINUTES,
+    'auto_send_enabled': True,
+    'last_auto_send': None
+}
+
+
+def _decode_gaps_column(value):
+    """Écarts encodés par codec.pack_ints (ou liste JSON des anciennes bases)"""
+    if value and value.startswith('['):
+        return json.loads(value)
+    return unpack_ints(value)
+
+
+class SQLiteStorage(ChangeNotifier):
+    """
+    Stockage SQLite (mode WAL). La clé primaire de `analyses` sert d'index
+    (journee, hour) ; `gaps` est indexée sur (category, journee).
+    Les lectures "heure précédente", "dernière heure" et les plages de
+    journées sont des recherches d'index, sans charger tout l'historique.
+    """
+
+    def __init__(self, db_file=SQLITE_FILE):
+        self.db_file = db_file
+        self._init_notifier()
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    # ============ CONFIG ============
+
+    def _get_config(self, key):
+        with self._lock:
+            row = self.conn.execute('SELECT value FROM config WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return DEFAULT_CONFIG.get(key)
+        return json.loads(row[0])
+
+    def _set_config(self, key, value):
+        with self._lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)',
+                (key, json.dumps(value))
+            )
+            self.conn.commit()
+
+    def get_interval_minutes(self):
+        """Récupère l'intervalle d'envoi en minutes"""
+        return self._get_config('interval_minutes')
+
+    def set_interval_minutes(self, minutes):
+        """Définit l'intervalle d'envoi en minutes"""
+        self._set_config('interval_minutes', minutes)
+
+    def is_auto_send_enabled(self):
+        """Vérifie si l'envoi automatique est activé"""
+        return self._get_config('auto_send_enabled')
+
+    def set_auto_send_enabled(self, enabled):
+        """Active/désactive l'envoi automatique"""
+        self._set_config('auto_send_enabled', enabled)
+
+    def get_last_auto_send(self, destination_id=None):
+        """Récupère le timestamp du dernier envoi automatique (global ou d'une destination)"""
+        if destination_id is not None:
+            last_send = self._get_config(last_auto_send_key(destination_id))
+            if last_send is not None:
+                return last_send
+        return self._get_config('last_auto_send')
+
+    def update_last_auto_send(self, destination_id=None):
+        """Met à jour le timestamp du dernier envoi automatique (global ou d'une destination)"""
+        key = 'last_auto_send' if destination_id is None else last_auto_send_key(destination_id)
+        self._set_config(key, datetime.now().isoformat())
+
+    # ============ ANALYSES ============
+
+    def save_data(self):
+        """Les écritures sont déjà validées ; on replie le WAL dans la base"""
+        with self._lock, STORAGE_WRITE_SECONDS.time(backend='sqlite', op='checkpoint'):
+            self.conn.commit()
+            self.conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+
+    def save_analysis(self, hour, gaps_data, journee=None, timestamp=None):
+        """Sauvegarde une analyse d'heure (fusion par catégorie, comme Storage)"""
+        if journee is None:
+            journee = get_current_journee()
+        if timestamp is None:
+            timestamp = datetime.now().isoformat()
+
+        with self._lock, STORAGE_WRITE_SECONDS.time(backend='sqlite', op='save_analysis'):
+            self.conn.execute(
+                'INSERT OR REPLACE INTO analyses (journee, hour, timestamp) VALUES (?, ?, ?)',
+                (journee, hour, timestamp)
+            )
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO gaps (journee, hour, category, max_gap, max_gap_pair, gaps) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [
+                    (journee, hour, category, data.get('max_gap'),
+                     json.dumps(data.get('max_gap_pair')), pack_ints(data.get('gaps', [])))
+                    for category, data in gaps_data.items()
+                ]
+            )
+            self.conn.execute(
+                'INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)',
+                ('last_analysis', json.dumps(timestamp))
+            )
+            self.conn.commit()
+        self._notify_analysis(journee, hour)
+
+    def _load_hours(self, journee, hours):
+        """Construit {hour: {'timestamp', 'gaps'}} pour les heures données"""
+        if not hours:
+            return {}
+        result = {hour: {'timestamp': timestamp, 'gaps': {}} for hour, timestamp in hours}
+        placeholders = ','.join('?' * len(result))
+        with self._lock:
+            rows = self.conn.execute(
+                f'SELECT hour, category, max_gap, max_gap_pair, gaps FROM gaps '
+                f'WHERE journee = ? AND hour IN ({placeholders})',
+                (journee, *result.keys())
+            ).fetchall()
+        for hour, category, max_gap, max_gap_pair, gaps in rows:
+            result[hour]['gaps'][category] = {
+                'max_gap': max_gap,
+                'gaps': _decode_gaps_column(gaps),
+                'max_gap_pair': json.loads(max_gap_pair)
+            }
+        return result
+
+    def _get_hour(self, journee, hour):
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT hour, timestamp FROM analyses WHERE journee = ? AND hour = ?',
+                (journee, hour)
+            ).fetchone()
+        return self._load_hours(journee, [row])[hour] if row else None
+
+    def get_previous_hour_data(self, current_hour):
+        """Récupère les données de l'heure précédente"""
+        journee = get_current_journee()
+        with self._lock:
+            exists = self.conn.execute(
+                'SELECT 1 FROM analyses WHERE journee = ? AND hour = ?', (journee, current_hour)
+            ).fetchone()
+            if not exists:
+                return None
+            row = self.conn.execute(
+                'SELECT hour FROM analyses WHERE journee = ? AND hour < ? ORDER BY hour DESC LIMIT 1',
+                (journee, current_hour)
+            ).fetchone()
+        return self._get_hour(journee, row[0]) if row else None
+
+    def get_next_hour_data(self, current_hour):
+        """Récupère les données de l'heure suivante"""
+        journee = get_current_journee()
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT hour FROM analyses WHERE journee = ? AND hour > ? ORDER BY hour LIMIT 1',
+                (journee, current_hour)
+            ).fetchone()
+        return self._get_hour(journee, row[0]) if row else None
+
+    def get_hours_in_range(self, start_hour, end_hour, journee=None):
+        """Heures analysées entre start_hour et end_hour inclus (triées)"""
+        if journee is None:
+            journee = get_current_journee()
+        with self._lock:
+            return [row[0] for row in self.conn.execute(
+                'SELECT hour FROM analyses WHERE journee = ? AND hour BETWEEN ? AND ? ORDER BY hour',
+                (journee, start_hour, end_hour)
+            )]
+
+    def get_last_parsed_data(self):
+        """Récupère les dernières données parsées pour l'envoi automatique"""
+        journee = get_current_journee()
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT hour FROM analyses WHERE journee = ? ORDER BY hour DESC LIMIT 1',
+                (journee,)
+            ).fetchone()
+        return self._get_hour(journee, row[0]) if row else None
+
+    def get_historique(self, journee=None):
+        """Récupère l'historique d'une journée"""
+        if journee is None:
+            journee = get_current_journee()
+        with self._lock:
+            hours = self.conn.execute(
+                'SELECT hour, timestamp FROM analyses WHERE journee = ? ORDER BY hour',
+                (journee,)
+            ).fetchall()
+        return self._load_hours(journee, hours)
+
+    def get_historique_range(self, start_journee, end_journee):
+        """Récupère l'historique de toutes les journées entre deux bornes incluses"""
+        with self._lock:
+            journees = [row[0] for row in self.conn.execute(
+                'SELECT DISTINCT journee FROM analyses WHERE journee BETWEEN ? AND ? ORDER BY journee',
+                (start_journee, end_journee)
+            )]
+        return {journee: self.get_historique(journee) for journee in journees}
+
+    def get_last_hours(self, count):
+        """Récupère les `count` dernières analyses [(journee, hour, data)], toutes journées confondues"""
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT journee, hour, timestamp FROM analyses ORDER BY journee DESC, hour DESC LIMIT ?',
+                (count,)
+            ).fetchall()
+        result = []
+        for journee, hour, timestamp in reversed(rows):
+            result.append((journee, hour, self._load_hours(journee, [(hour, timestamp)])[hour]))
+        return result
+
+    def close(self):
+        with self._lock:
+            self.conn.commit()
+            self.conn.close()
+
+
+def migrate_json(json_file, storage, history_dir=HISTORY_DIR):
+    """
+    Importe un stockage JSON existant (ecarts_data.json) dans un SQLiteStorage.
+    Les données sont lues par storage.Storage / JournalStorage, comme au
+    démarrage du bot : écarts encodés, partitions de HISTORY_DIR et rejeu
+    du journal compris. La source est ouverte en lecture seule et n'est
+    jamais fermée ni sauvegardée : les fichiers d'entrée restent intacts.
+    """
+    backend = 'journal' if os.path.exists(f"{json_file}.journal") else 'json'
+    source = create_storage(backend, json_file, history_dir=history_dir, read_only=True)
+
+    imported = 0
+    for journee, hours in source.data['historique'].items():
+        for hour, hour_data in hours.items():
+            storage.save_analysis(
+                hour, hour_data.get('gaps', {}),
+                journee=journee, timestamp=hour_data.get('timestamp') or datetime.now().isoformat()
+            )
+            imported += 1
+
+    for key, value in source.data['config'].items():
+        storage._set_config(key, value)
+
+    return imported
+
+
+if __name__ == "__main__":
+    # Usage: python sqlite_storage.py [ecarts_data.json] [ecarts_data.db]
+    from config import DATA_FILE
+    source = sys.argv[1] if len(sys.argv) > 1 else DATA_FILE
+    target = sys.argv[2] if len(sys.argv) > 2 else SQLITE_FILE
+    db = SQLiteStorage(target)
+    count = migrate_json(source, db)
+    db.close()
+    print(f"✅ {count} analyses importées de {source} vers {target}")
@@ -3,22 +3,175 @@ Gestion du stockage JSON des écarts
 """
 import json
 import os
+import threading
+from bisect import bisect_left, bisect_right
 from datetime import datetime
-from config import DATA_FILE, get_current_journee, DEFAULT_INTERVAL_MINUTES
+from config import (
+    DATA_FILE, get_current_journee, DEFAULT_INTERVAL_MINUTES,
+    STORAGE_BACKEND, JOURNAL_COMPACT_EVERY, WRITE_BEHIND_DELAY,
+    HISTORY_DIR, HISTORY_MEMORY_BUDGET_MB
+)
+from history import PartitionedHistory
+from codec import encode_day, decode_day, encode_gaps_data, decode_gaps_data
+from log import get_logger
+from metrics import STORAGE_WRITE_SECONDS
 
-class Storage:
-    def __init__(self):
+logger = get_logger('storage')
+
+
+def last_auto_send_key(destination_id):
+    """Clé de config du dernier envoi automatique d'une destination"""
+    return f"last_auto_send:{destination_id}"
+
+
+def write_text_atomic(path, text):
+    """Écrit un fichier via un fichier temporaire puis os.replace"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class WriteBehindFlusher:
+    """
+    Thread de fond qui regroupe les mutations : après la première mutation
+    marquée, il attend `delay` secondes puis appelle flush_fn une seule fois
+    pour toutes les mutations arrivées entre-temps.
+    """
+
+    def __init__(self, flush_fn, delay):
+        self.flush_fn = flush_fn
+        self.delay = delay
+        self._dirty = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='storage-write-behind', daemon=True)
+        self._thread.start()
+
+    def mark_dirty(self):
+        self._dirty.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._dirty.wait()
+            if self._stopped.is_set():
+                break
+            self._stopped.wait(self.delay)
+            self._dirty.clear()
+            try:
+                self.flush_fn()
+            except Exception as e:
+                logger.error("❌ Erreur écriture différée: %s", e)
+
+    def stop(self):
+        """Arrête le thread (le flush final est fait par l'appelant)"""
+        self._stopped.set()
+        self._dirty.set()
+        self._thread.join(timeout=5)
+
+
+class HourIndex:
+    """Heures triées d'une journée, mises à jour à l'insertion (recherches par bisection)"""
+
+    def __init__(self, hours=()):
+        self.hours = sorted(hours)
+
+    def add(self, hour):
+        i = bisect_left(self.hours, hour)
+        if i == len(self.hours) or self.hours[i] != hour:
+            self.hours.insert(i, hour)
+
+    def __contains__(self, hour):
+        i = bisect_left(self.hours, hour)
+        return i < len(self.hours) and self.hours[i] == hour
+
+    def previous(self, hour):
+        """Heure précédant `hour` (None si aucune)"""
+        i = bisect_left(self.hours, hour)
+        return self.hours[i - 1] if i > 0 else None
+
+    def next(self, hour):
+        """Heure suivant `hour` (None si aucune)"""
+        i = bisect_right(self.hours, hour)
+        return self.hours[i] if i < len(self.hours) else None
+
+    def latest(self):
+        return self.hours[-1] if self.hours else None
+
+    def between(self, start, end):
+        """Heures comprises entre start et end inclus"""
+        return self.hours[bisect_left(self.hours, start):bisect_right(self.hours, end)]
+
+
+class ChangeNotifier:
+    """
+    Version des données d'analyse et abonnés aux modifications.
+    data_version augmente à chaque analyse enregistrée (pas aux changements
+    de config) ; chaque abonné reçoit (journee, hour) de l'heure modifiée.
+    """
+
+    def _init_notifier(self):
+        self.data_version = 0
+        self._listeners = []
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def _notify_analysis(self, journee, hour):
+        self.data_version += 1
+        for listener in self._listeners:
+            listener(journee, hour)
+
+
+class Storage(ChangeNotifier):
+    backend = 'json'
+
+    def __init__(self, data_file=DATA_FILE, write_behind_delay=WRITE_BEHIND_DELAY, history_dir=HISTORY_DIR,
+                 read_only=False):
+        self.data_file = data_file
+        self.history_dir = history_dir
+        # Lecture seule (migration) : pas d'écriture différée, rien n'est réécrit à la fermeture
+        self.read_only = read_only
+        self._init_notifier()
+        # _lock protège self.data, _io_lock sérialise les écritures disque
+        self._lock = threading.RLock()
+        self._io_lock = threading.RLock()
+        self._pending = []
+        # Index des heures par journée, construit au premier accès
+        self._hour_indexes = {}
         self.data = self.load_data()
+        self._flusher = None
+        if write_behind_delay and write_behind_delay > 0 and not read_only:
+            self._flusher = WriteBehindFlusher(self.flush, write_behind_delay)
     
     def load_data(self):
         """Charge les données depuis le fichier JSON"""
-        if os.path.exists(DATA_FILE):
+        data = self.init_data()
+        if os.path.exists(self.data_file):
             try:
-                with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                with open(self.data_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
             except:
-                return self.init_data()
-        return self.init_data()
+                pass
+        # Les listes d'écarts sont encodées sur disque (voir codec.py)
+        data['historique'] = {journee: decode_day(hours) for journee, hours in data.get('historique', {}).items()}
+        if self.history_dir:
+            data['historique'] = self._partition_history(data.get('historique', {}))
+        return data
+    
+    def _partition_history(self, inline_history):
+        """
+        Historique en un fichier par journée (HISTORY_DIR). Un historique
+        encore stocké dans le fichier principal est migré vers les partitions.
+        """
+        history = PartitionedHistory(
+            self.history_dir, HISTORY_MEMORY_BUDGET_MB * 1024 * 1024,
+            dumps=self._serialize_day, loads=self._deserialize_day
+        )
+        for journee, hours in inline_history.items():
+            history[journee] = hours
+        return history
     
     def init_data(self):
         """Initialise la structure des données"""
@@ -34,62 +187,201 @@ class Storage:
     
     def save_data(self):
         """Sauvegarde les données dans le fichier JSON"""
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        with self._io_lock, STORAGE_WRITE_SECONDS.time(backend=self.backend, op='save_data'):
+            self._write_snapshot()
     
-    def save_analysis(self, hour, gaps_data):
-        """Sauvegarde une analyse d'heure.
-        Fusionne avec les données existantes : les nouvelles données prennent
-        la priorité, mais les catégories absentes du nouveau message sont conservées.
+    def _write_snapshot(self):
         """
-        journee = get_current_journee()
+        Écrit l'état complet (appelé avec _io_lock). Seule la copie des
+        données est faite sous _lock : l'encodage et l'écriture disque ne
+        bloquent pas _mutate.
+        """
+        with self._lock:
+            # Le snapshot couvre aussi les mutations en attente
+            self._pending = []
+            historique = self.data['historique']
+            if isinstance(historique, PartitionedHistory):
+                days = historique.take_dirty()
+                inline_history = {}
+            else:
+                days = []
+                inline_history = {journee: dict(hours) for journee, hours in historique.items()}
+            main = {
+                key: dict(value) if isinstance(value, dict) else value
+                for key, value in self.data.items() if key != 'historique'
+            }
+        written = False
+        try:
+            files = [(historique.path_for(journee), self._serialize_day(day)) for journee, day in days]
+            main['historique'] = {journee: encode_day(hours) for journee, hours in inline_history.items()}
+            files.append((self.data_file, self._serialize(main)))
+            for path, text in files:
+                write_text_atomic(path, text)
+            written = True
+        finally:
+            if days:
+                historique.written([journee for journee, _ in days], ok=written)
+    
+    def _serialize(self, data):
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    
+    def _serialize_day(self, hours):
+        return self._serialize(encode_day(hours))
+    
+    def _deserialize_day(self, text):
+        return decode_day(json.loads(text))
+    
+    def flush(self):
+        """Écrit immédiatement les mutations en attente (mode écriture différée)"""
+        # _io_lock d'abord (même ordre que _write_snapshot) : vider _pending et
+        # l'écrire forment une seule section, un snapshot ne peut pas s'intercaler
+        with self._io_lock:
+            with self._lock:
+                records, self._pending = self._pending, []
+            if records:
+                with STORAGE_WRITE_SECONDS.time(backend=self.backend, op='flush'):
+                    self._persist(records)
+    
+    def close(self):
+        """Arrête l'écriture différée et sauvegarde tout"""
+        if self._flusher is not None:
+            self._flusher.stop()
+            self._flusher = None
+        if not self.read_only:
+            self.save_data()
+    
+    def _mutate(self, record):
+        """
+        Applique une mutation en mémoire puis la persiste, immédiatement ou,
+        en mode écriture différée, au prochain flush du thread de fond
+        """
+        with self._lock:
+            self._apply(record)
+            if self._flusher is not None:
+                self._pending.append(record)
+        if record['op'] == 'analysis':
+            self._notify_analysis(record['journee'], record['hour'])
+        if self._flusher is not None:
+            self._flusher.mark_dirty()
+        else:
+            self._persist([record])
+    
+    def _apply(self, record):
+        """Applique une mutation ({'op': 'analysis'|'config', ...}) à self.data"""
+        if record['op'] == 'analysis':
+            journee = record['journee']
+            hour = record['hour']
 
-        if journee not in self.data['historique']:
-            self.data['historique'][journee] = {}
+            if journee not in self.data['historique']:
+                self.data['historique'][journee] = {}
 
-        existing_gaps = self.data['historique'][journee].get(hour, {}).get('gaps', {})
-        merged_gaps = {**existing_gaps, **gaps_data}
+            existing_gaps = self.data['historique'][journee].get(hour, {}).get('gaps', {})
+            merged_gaps = {**existing_gaps, **record['gaps']}
 
-        self.data['historique'][journee][hour] = {
-            'timestamp': datetime.now().isoformat(),
-            'gaps': merged_gaps
-        }
+            self.data['historique'][journee][hour] = {
+                'timestamp': record['timestamp'],
+                'gaps': merged_gaps
+            }
+            if isinstance(self.data['historique'], PartitionedHistory):
+                self.data['historique'].mark_dirty(journee)
+            if journee in self._hour_indexes:
+                self._hour_indexes[journee].add(hour)
 
-        self.data['config']['last_analysis'] = datetime.now().isoformat()
+            self.data['config']['last_analysis'] = record['timestamp']
+        elif record['op'] == 'config':
+            self.data['config'][record['key']] = record['value']
+    
+    def _persist(self, records):
+        """Persiste des mutations (ici : réécriture complète du fichier)"""
         self.save_data()
     
+    def save_analysis(self, hour, gaps_data):
+        """Sauvegarde une analyse d'heure.
+        Fusionne avec les données existantes : les nouvelles données prennent
+        la priorité, mais les catégories absentes du nouveau message sont conservées.
+        """
+        self._mutate({
+            'op': 'analysis',
+            'journee': get_current_journee(),
+            'hour': hour,
+            'timestamp': datetime.now().isoformat(),
+            'gaps': gaps_data
+        })
+    
+    def _hour_index(self, journee):
+        """Index trié des heures d'une journée (None si la journée n'existe pas)"""
+        index = self._hour_indexes.get(journee)
+        if index is None:
+            if journee not in self.data['historique']:
+                return None
+            index = HourIndex(self.data['historique'][journee].keys())
+            self._hour_indexes[journee] = index
+        return index
+    
     def get_previous_hour_data(self, current_hour):
         """Récupère les données de l'heure précédente"""
         journee = get_current_journee()
+        index = self._hour_index(journee)
         
-        if journee not in self.data['historique']:
+        if index is None or current_hour not in index:
             return None
         
-        hours = sorted(self.data['historique'][journee].keys())
-        try:
-            idx = hours.index(current_hour)
-            if idx > 0:
-                prev_hour = hours[idx - 1]
-                return self.data['historique'][journee][prev_hour]
-        except ValueError:
-            pass
-        
+        prev_hour = index.previous(current_hour)
+        if prev_hour is not None:
+            return self.data['historique'][journee][prev_hour]
         return None
     
+    def get_next_hour_data(self, current_hour):
+        """Récupère les données de l'heure suivante"""
+        journee = get_current_journee()
+        index = self._hour_index(journee)
+        next_hour = index.next(current_hour) if index is not None else None
+        if next_hour is not None:
+            return self.data['historique'][journee][next_hour]
+        return None
+    
+    def get_hours_in_range(self, start_hour, end_hour, journee=None):
+        """Heures analysées entre start_hour et end_hour inclus (triées)"""
+        if journee is None:
+            journee = get_current_journee()
+        index = self._hour_index(journee)
+        return index.between(start_hour, end_hour) if index is not None else []
+    
     def get_historique(self, journee=None):
         """Récupère l'historique d'une journée"""
         if journee is None:
             journee = get_current_journee()
         return self.data['historique'].get(journee, {})
     
+    def get_historique_range(self, start_journee, end_journee):
+        """Récupère l'historique de toutes les journées entre deux bornes incluses"""
+        historique = self.data['historique']
+        return {
+            journee: historique[journee]
+            for journee in sorted(historique)
+            if start_journee <= journee <= end_journee
+        }
+    
+    def get_last_hours(self, count):
+        """Récupère les `count` dernières analyses [(journee, hour, data)], toutes journées confondues"""
+        historique = self.data['historique']
+        entries = []
+        # Les journées sont parcourues de la plus récente à la plus ancienne
+        for journee in sorted(historique, reverse=True):
+            if len(entries) >= count:
+                break
+            hours = historique[journee]
+            for hour in reversed(self._hour_index(journee).hours):
+                entries.append((journee, hour, hours[hour]))
+        return list(reversed(entries[:max(count, 0)]))
+    
     def get_interval_minutes(self):
         """Récupère l'intervalle d'envoi en minutes"""
         return self.data['config'].get('interval_minutes', DEFAULT_INTERVAL_MINUTES)
     
     def set_interval_minutes(self, minutes):
         """Définit l'intervalle d'envoi en minutes"""
-        self.data['config']['interval_minutes'] = minutes
-        self.save_data()
+        self._mutate({'op': 'config', 'key': 'interval_minutes', 'value': minutes})
     
     def is_auto_send_enabled(self):
         """Vérifie si l'envoi automatique est activé"""
@@ -97,24 +389,111 @@ class Storage:
     
     def set_auto_send_enabled(self, enabled):
         """Active/désactive l'envoi automatique"""
-        self.data['config']['auto_send_enabled'] = enabled
-        self.save_data()
+        self._mutate({'op': 'config', 'key': 'auto_send_enabled', 'value': enabled})
     
-    def get_last_auto_send(self):
-        """Récupère le timestamp du dernier envoi automatique"""
-        return self.data['config'].get('last_auto_send')
+    def get_last_auto_send(self, destination_id=None):
+        """Récupère le timestamp du dernier envoi automatique (global ou d'une destination)"""
+        config = self.data['config']
+        if destination_id is not None:
+            last_send = config.get(last_auto_send_key(destination_id))
+            if last_send is not None:
+                return last_send
+        return config.get('last_auto_send')
     
-    def update_last_auto_send(self):
-        """Met à jour le timestamp du dernier envoi automatique"""
-        self.data['config']['last_auto_send'] = datetime.now().isoformat()
-        self.save_data()
+    def update_last_auto_send(self, destination_id=None):
+        """Met à jour le timestamp du dernier envoi automatique (global ou d'une destination)"""
+        key = 'last_auto_send' if destination_id is None else last_auto_send_key(destination_id)
+        self._mutate({'op': 'config', 'key': key, 'value': datetime.now().isoformat()})
     
     def get_last_parsed_data(self):
         """Récupère les dernières données parsées pour l'envoi automatique"""
         journee = get_current_journee()
-        if journee in self.data['historique']:
-            hours = sorted(self.data['historique'][journee].keys())
-            if hours:
-                last_hour = hours[-1]
-                return self.data['historique'][journee][last_hour]
+        index = self._hour_index(journee)
+        last_hour = index.latest() if index is not None else None
+        if last_hour is not None:
+            return self.data['historique'][journee][last_hour]
         return None
+
+
+class JournalStorage(Storage):
+    """
+    Stockage en journal : chaque mutation est ajoutée en une ligne JSON
+    compacte à la fin du journal, au lieu de réécrire tout le fichier.
+    Tous les JOURNAL_COMPACT_EVERY enregistrements (et à save_data), l'état
+    complet est écrit atomiquement dans le snapshot et le journal est vidé.
+    Au démarrage : snapshot + rejeu du journal.
+    """
+
+    backend = 'journal'
+
+    def __init__(self, data_file=DATA_FILE, compact_every=JOURNAL_COMPACT_EVERY,
+                 write_behind_delay=WRITE_BEHIND_DELAY, history_dir=HISTORY_DIR, read_only=False):
+        self.journal_file = f"{data_file}.journal"
+        self.compact_every = compact_every
+        self.journal_records = 0
+        self._journal = None
+        super().__init__(data_file, write_behind_delay, history_dir, read_only)
+        if not read_only:
+            self._journal = open(self.journal_file, 'a', encoding='utf-8')
+
+    def load_data(self):
+        """Charge le snapshot puis rejoue le journal"""
+        self.data = super().load_data()
+        if os.path.exists(self.journal_file):
+            valid_size = 0
+            truncated = False
+            with open(self.journal_file, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        if record['op'] == 'analysis':
+                            record['gaps'] = decode_gaps_data(record['gaps'])
+                    except ValueError:
+                        # Dernière ligne tronquée (arrêt pendant l'écriture)
+                        truncated = True
+                        break
+                    self._apply(record)
+                    self.journal_records += 1
+                    valid_size += len(line)
+            if truncated and not self.read_only:
+                os.truncate(self.journal_file, valid_size)
+        return self.data
+
+    def _persist(self, records):
+        with self._io_lock, STORAGE_WRITE_SECONDS.time(backend=self.backend, op='journal_append'):
+            for record in records:
+                if record['op'] == 'analysis':
+                    record = {**record, 'gaps': encode_gaps_data(record['gaps'])}
+                self._journal.write(self._serialize(record) + '\n')
+            self._journal.flush()
+            self.journal_records += len(records)
+            if self.journal_records >= self.compact_every:
+                self.compact()
+
+    def compact(self):
+        """Écrit le snapshot complet puis vide le journal"""
+        with self._io_lock, STORAGE_WRITE_SECONDS.time(backend=self.backend, op='compact'):
+            self._write_snapshot()
+            self._journal.close()
+            self._journal = open(self.journal_file, 'w', encoding='utf-8')
+            self.journal_records = 0
+
+    def save_data(self):
+        """Sauvegarde complète = compaction"""
+        self.compact()
+
+    def close(self):
+        super().close()
+        if self._journal is not None:
+            self._journal.close()
+
+
+def create_storage(backend=STORAGE_BACKEND, data_file=DATA_FILE, sqlite_file=None, history_dir=HISTORY_DIR,
+                   read_only=False):
+    """Instancie le stockage configuré ('json', 'journal' ou 'sqlite')"""
+    if backend == 'sqlite':
+        from sqlite_storage import SQLiteStorage
+        return SQLiteStorage(sqlite_file) if sqlite_file else SQLiteStorage()
+    if backend == 'journal':
+        return JournalStorage(data_file, history_dir=history_dir, read_only=read_only)
+    return Storage(data_file, history_dir=history_dir, read_only=read_only)
@@ -0,0 +1,148 @@
+"""
+Messages "STATISTIQUES COMPLÈTES" synthétiques (benchmarks, essais)
+"""
+import random
+from config import CATEGORIES
+
+OUTCOME_CATEGORIES = ('Victoire Joueur', 'Victoire Banquier', 'Match Nul')
+PARITY_CATEGORIES = ('Pair', 'Impair')
+PAIR_CATEGORIES = ('3/2', '3/3', '2/2', '2/3')
+# Chaque jeu apparaît dans une catégorie de chaque groupe
+NUMBERS_PER_GAME = 3
+
+# Format des sections :
+# - 'config'   : "Liste des numéros - X", paires en blocs ┏━┓ "Configuration: X/Y"
+#                suivis de "La liste des numéros"
+# - 'liste'    : "Liste des numéros - X" pour toutes les catégories
+# - 'fallback' : titres ━━━ seuls ("VICTOIRE JOUEUR", "PAIR (Chronologique)", "💪 3/2")
+STYLES = ('config', 'liste', 'fallback')
+
+HEAVY_SEPARATOR = '━' * 20
+LIGHT_SEPARATOR = '─' * 20
+
+# En-tête de chaque catégorie selon le style
+_LISTE_HEADERS = {
+    'Victoire Joueur': 'VICTOIRE JOUEUR',
+    'Victoire Banquier': 'VICTOIRE BANQUIER',
+    'Match Nul': 'MATCH NUL',
+    'Pair': 'PAIR',
+    'Impair': 'IMPAIR',
+    '3/2': '3/2',
+    '3/3': '3/3',
+    '2/2': '2/2',
+    '2/3': '2/3'
+}
+_FALLBACK_HEADERS = {
+    'Victoire Joueur': '👤 VICTOIRE JOUEUR',
+    'Victoire Banquier': '🏦 VICTOIRE BANQUIER',
+    'Match Nul': '⚖️ MATCH NUL',
+    'Pair': '🔵 PAIR (Chronologique)',
+    'Impair': '🔴 IMPAIR (Chronologique)',
+    '3/2': '💪 3/2',
+    '3/3': '🔥 3/3',
+    '2/2': '🎯 2/2',
+    '2/3': '🍀 2/3'
+}
+
+
+def games_for_numbers(numbers):
+    """Nombre de jeux donnant au moins `numbers` numéros au total"""
+    return -(-numbers // NUMBERS_PER_GAME)
+
+
+def generate_games(games, seed=0, first=1301):
+    """
+    Tire le résultat de chaque jeu : une issue (joueur / banquier / nul),
+    une parité et une configuration de paire.
+    Retourne {catégorie: [numéros croissants]} pour toutes les CATEGORIES.
+    """
+    rng = random.Random(seed)
+    categories = {name: [] for name in CATEGORIES}
+    for number in range(first, first + games):
+        categories[rng.choices(OUTCOME_CATEGORIES, weights=(45, 45, 10))[0]].append(number)
+        categories[rng.choice(PARITY_CATEGORIES)].append(number)
+        categories[rng.choice(PAIR_CATEGORIES)].append(number)
+    return categories
+
+
+def _number_lines(numbers, per_line):
+    return [
+        ', '.join(f'#N{n}' for n in numbers[i:i + per_line])
+        for i in range(0, len(numbers), per_line)
+    ]
+
+
+def _liste_section(name, numbers, per_line):
+    return [
+        f"📋 Liste des numéros - {_LISTE_HEADERS[name]} ({len(numbers)})",
+        *_number_lines(numbers, per_line),
+        LIGHT_SEPARATOR
+    ]
+
+
+def _title(text):
+    """Ligne de titre ━━━ X ━━━ : délimiteur majeur pour le parseur"""
+    return f"{'━' * 8} {text} {'━' * 8}"
+
+
+def _fallback_section(name, numbers, per_line):
+    return [
+        _title(f"{_FALLBACK_HEADERS[name]} ({len(numbers)})"),
+        *_number_lines(numbers, per_line),
+        ""
+    ]
+
+
+def _config_block(name, numbers, per_line):
+    return [
+        '┏' + HEAVY_SEPARATOR + '┓',
+        f"┃ {_FALLBACK_HEADERS[name].split()[0]} Configuration: {name}",
+        '┗' + HEAVY_SEPARATOR + '┛',
+        f"📊 Occurrences : {len(numbers)}",
+        "📋 La liste des numéros (Chronologique) :",
+        *_number_lines(numbers, per_line),
+        ""
+    ]
+
+
+def format_message(categories, total_games, style='config', per_line=8):
+    """Texte du message tel que publié dans le canal source"""
+    if style not in STYLES:
+        raise ValueError(f"Style inconnu: {style}")
+    lines = [
+        "📊 STATISTIQUES COMPLÈTES 📊",
+        f"Total jeux analysés : {total_games}",
+        HEAVY_SEPARATOR
+    ]
+    section = _fallback_section if style == 'fallback' else _liste_section
+
+    lines.append(_title("🏆 RÉSULTATS"))
+    for name in OUTCOME_CATEGORIES:
+        lines += section(name, categories[name], per_line)
+
+    # PAIR avant IMPAIR : "PAIR (Chronologique)" est contenu dans "IMPAIR (Chronologique)"
+    lines.append(_title("🎲 PARITÉ"))
+    for name in PARITY_CATEGORIES:
+        lines += section(name, categories[name], per_line)
+
+    lines.append(_title("🃏 CONFIGURATIONS"))
+    for name in PAIR_CATEGORIES:
+        if style == 'config':
+            lines += _config_block(name, categories[name], per_line)
+        else:
+            lines += section(name, categories[name], per_line)
+    lines += [_title("✅ FIN"), HEAVY_SEPARATOR]
+    return '\n'.join(lines)
+
+
+def generate_message(games, style='config', seed=0, per_line=8):
+    """
+    Retourne (texte, résultat attendu du parseur) pour `games` jeux.
+    Le résultat attendu a le format de MessageParser.parse_message.
+    """
+    categories = generate_games(games, seed)
+    expected = {
+        'total_games': games,
+        'categories': {name: numbers for name, numbers in categories.items() if numbers}
+    }
+    return format_message(categories, games, style, per_line), expected
@@ -0,0 +1,81 @@
+"""
+BatchGapEngine : mêmes résultats que GapAnalyzer, recalcul sur l'historique enregistré
+"""
+import json
+import random
+import statistics
+from datetime import datetime, timedelta
+
+import pytest
+
+from analyzer import GapAnalyzer, BatchGapEngine, np
+from bot import BotLogic
+from config import CATEGORIES, get_current_journee
+from storage import Storage
+
+ENGINES = [False, pytest.param(True, marks=pytest.mark.skipif(np is None, reason='numpy absent'))]
+
+
+def random_datasets(seed, days=5):
+    rng = random.Random(seed)
+    return {
+        f"Journée_2026010{day}": {'categories': {
+            name: sorted(rng.sample(range(1, 2000), rng.choice([0, 1, 2, rng.randint(3, 300)])))
+            for name in CATEGORIES
+        }}
+        for day in range(1, days + 1)
+    }
+
+
+@pytest.mark.parametrize('use_numpy', ENGINES)
+def test_engine_matches_gap_analyzer(use_numpy):
+    datasets = random_datasets(seed=1)
+    engine = BatchGapEngine(use_numpy=use_numpy)
+    analyzer = GapAnalyzer()
+
+    results = engine.analyze_many(datasets)
+
+    for key, data in datasets.items():
+        expected = analyzer.analyze_all_categories(data)
+        for name, result in results[key].items():
+            assert {k: result[k] for k in expected[name]} == expected[name]
+            gaps = result['gaps']
+            if len(gaps) >= 2:
+                assert result['mean_gap'] == pytest.approx(statistics.fmean(gaps))
+                quantiles = statistics.quantiles(gaps, n=100, method='inclusive')
+                for p in engine.percentiles:
+                    assert result['percentiles'][p] == pytest.approx(quantiles[p - 1])
+
+
+def test_tendances_recompute_stored_history(tmp_path):
+    # Deux journées enregistrées comme par le bot : écarts + paire du max, heures cumulatives
+    today = get_current_journee()
+    yesterday = f"Journée_{(datetime.strptime(today.split('_', 1)[1], '%Y%m%d') - timedelta(days=1)).strftime('%Y%m%d')}"
+    analyzer = GapAnalyzer()
+    days = {
+        yesterday: [[3, 5, 12], [3, 5, 12, 13, 20, 21]],
+        today: [[1, 2, 10, 11]]
+    }
+    historique = {}
+    for journee, messages in days.items():
+        historique[journee] = {}
+        for i, numbers in enumerate(messages):
+            gaps, max_gap, pair = analyzer.calculate_gaps(numbers)
+            historique[journee][f"{10 + i:02d}:00"] = {
+                'timestamp': f"2026-01-01T{10 + i:02d}:00:00",
+                'gaps': {'Pair': {'max_gap': max_gap, 'gaps': gaps, 'max_gap_pair': list(pair)}}
+            }
+    data_file = tmp_path / 'ecarts_data.json'
+    data_file.write_text(json.dumps({'historique': historique, 'config': {}}), encoding='utf-8')
+    storage = Storage(str(data_file), write_behind_delay=0, history_dir='')
+
+    results = BatchGapEngine().analyze_history(storage.get_historique_range(yesterday, today))
+
+    # La dernière heure de la journée donne la liste complète des numéros
+    assert results[yesterday]['Pair']['numbers'] == [3, 5, 12, 13, 20, 21]
+    assert results[yesterday]['Pair']['max_gap_pair'] == (5, 12)
+    assert results[today]['Pair']['mean_gap'] == pytest.approx(10 / 3)
+
+    text = BotLogic(storage).format_tendances(2)
+    assert yesterday.replace('_', ' ') in text and today.replace('_', ' ') in text
+    assert "Pair : 7 | moy 3.6 | p50 2 p90 7 p99 7" in text
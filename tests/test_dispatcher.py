@@ -0,0 +1,141 @@
+"""
+OutboundDispatcher contre le faux serveur de l'API Bot (fake_telegram.py)
+"""
+import asyncio
+import pytest
+
+pytest.importorskip('telegram')
+
+from telegram import Bot
+from telegram.error import BadRequest
+from telegram.request import HTTPXRequest
+from dispatcher import OutboundDispatcher, DispatcherStopped, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from fake_telegram import FakeTelegramServer
+
+TOKEN = '123456:TEST'
+CHAT = -1001000000001
+OTHER_CHAT = -1001000000002
+
+# Limites assez hautes pour ne pas interférer avec ce que teste chaque cas
+NO_LIMITS = {'per_chat_rate': 1000, 'per_chat_burst': 100, 'global_rate': 1000}
+
+
+@pytest.fixture
+def fake_server():
+    servers = []
+
+    def start(**options):
+        server = FakeTelegramServer(**options).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def run_with_dispatcher(server, scenario, **options):
+    """Exécute scenario(dispatcher) avec un vrai Bot pointant sur le faux serveur"""
+    async def main():
+        # Pool de connexions comme en production (SEND_POOL_SIZE)
+        request = HTTPXRequest(connection_pool_size=8)
+        async with Bot(TOKEN, base_url=server.base_url, request=request) as bot:
+            dispatcher = OutboundDispatcher(**options)
+            dispatcher.start(bot)
+            try:
+                return await scenario(dispatcher)
+            finally:
+                await dispatcher.stop()
+    return asyncio.run(main())
+
+
+def sent_at(server, chat_id):
+    return [message['at'] for message in server.sent if message['chat_id'] == chat_id]
+
+
+def test_per_chat_rate_limit(fake_server):
+    server = fake_server()
+
+    async def scenario(dispatcher):
+        await asyncio.gather(
+            *(dispatcher.send(CHAT, f"m{i}") for i in range(6)),
+            dispatcher.send(OTHER_CHAT, "autre")
+        )
+
+    run_with_dispatcher(server, scenario, per_chat_rate=10, per_chat_burst=2, global_rate=1000)
+
+    times = sent_at(server, CHAT)
+    assert len(times) == 6
+    # Rafale de 2 puis un message toutes les 100 ms
+    assert times[1] - times[0] < 0.08
+    assert times[5] - times[0] >= 0.35
+    # L'autre chat a son propre seau : il n'attend pas le premier
+    assert sent_at(server, OTHER_CHAT)[0] - times[0] < 0.08
+
+
+def test_retry_after_blocks_chat_then_retries(fake_server):
+    server = fake_server(flood_limit=1)
+
+    async def scenario(dispatcher):
+        await asyncio.gather(dispatcher.send(CHAT, "premier"), dispatcher.send(CHAT, "second"))
+        return dispatcher.stats()
+
+    stats = run_with_dispatcher(server, scenario, **NO_LIMITS)
+
+    assert server.flood_errors >= 1
+    assert stats['rate_limited'] == server.flood_errors
+    assert stats['sent'] == 2 and stats['failed'] == 0
+    times = sent_at(server, CHAT)
+    # retry_after de 1 s respecté avant le nouvel essai
+    assert times[1] - times[0] >= 0.9
+
+
+def test_bad_request_is_not_retried(fake_server):
+    server = fake_server(reject_chats=[CHAT])
+
+    async def scenario(dispatcher):
+        with pytest.raises(BadRequest):
+            await dispatcher.send(CHAT, "rejeté")
+        return dispatcher.stats()
+
+    stats = run_with_dispatcher(server, scenario, **NO_LIMITS)
+
+    assert server.calls['sendMessage'] == 1
+    assert stats == {**stats, 'sent': 0, 'failed': 1, 'retried': 0}
+
+
+def test_priority_order(fake_server):
+    # Un seul worker occupé par un envoi lent : les suivants attendent en file
+    server = fake_server(send_latency=0.2)
+
+    async def scenario(dispatcher):
+        first = asyncio.create_task(dispatcher.send(CHAT, "occupe", priority=PRIORITY_LOW))
+        await asyncio.sleep(0.05)
+        await asyncio.gather(
+            first,
+            dispatcher.send(CHAT, "bas", priority=PRIORITY_LOW),
+            dispatcher.send(CHAT, "normal", priority=PRIORITY_NORMAL),
+            dispatcher.send(CHAT, "haut", priority=PRIORITY_HIGH)
+        )
+
+    run_with_dispatcher(server, scenario, workers=1, **NO_LIMITS)
+
+    assert [message['text'] for message in server.sent] == ["occupe", "haut", "normal", "bas"]
+
+
+def test_stop_fails_pending_sends(fake_server):
+    server = fake_server(send_latency=0.5)
+
+    async def scenario(dispatcher):
+        in_flight = asyncio.create_task(dispatcher.send(CHAT, "en cours"))
+        queued = asyncio.create_task(dispatcher.send(CHAT, "en file"))
+        await asyncio.sleep(0.1)
+        await asyncio.wait_for(dispatcher.stop(), timeout=2)
+        results = await asyncio.wait_for(asyncio.gather(in_flight, queued, return_exceptions=True), timeout=2)
+        with pytest.raises(DispatcherStopped):
+            await dispatcher.send(CHAT, "après l'arrêt")
+        return results
+
+    results = run_with_dispatcher(server, scenario, workers=1, **NO_LIMITS)
+
+    assert all(isinstance(result, DispatcherStopped) for result in results)
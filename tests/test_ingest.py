@@ -0,0 +1,35 @@
+"""
+IngestQueue : regroupement par heure et éviction quand la file est pleine
+"""
+import asyncio
+
+from ingest import IngestQueue
+
+
+def test_full_queue_evicts_oldest_key():
+    superseded = []
+    processed = []
+
+    async def handler(item):
+        processed.append(item)
+
+    async def main():
+        queue = IngestQueue(handler, max_size=2, on_superseded=lambda item, reason: superseded.append((item, reason)))
+        outcomes = [
+            await queue.put('10:00', 'a'),
+            await queue.put('11:00', 'b'),
+            await queue.put('11:00', 'b2'),
+            await queue.put('12:00', 'c')
+        ]
+        worker = asyncio.create_task(queue.run())
+        await asyncio.sleep(0.05)
+        worker.cancel()
+        return outcomes, queue.stats()
+
+    outcomes, stats = asyncio.run(main())
+
+    assert outcomes == ['queued', 'queued', 'coalesced', 'evicted']
+    # Le plus ancien (10:00) laisse sa place, le plus récent de 11:00 est gardé
+    assert superseded == [('b', 'coalesced'), ('a', 'evicted')]
+    assert processed == ['b2', 'c']
+    assert stats == {**stats, 'received': 4, 'coalesced': 1, 'evicted': 1, 'processed': 2, 'depth': 0}
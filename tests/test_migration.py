@@ -0,0 +1,76 @@
+"""
+migrate_json : import vers SQLite sans toucher aux fichiers d'entrée
+"""
+import json
+import os
+
+from codec import encode_gaps_data
+from config import get_current_journee
+from sqlite_storage import SQLiteStorage, migrate_json
+from storage import JournalStorage
+
+OLD_DAY = '2026-01-01'
+GAPS = {'Pair': {'max_gap': 3, 'gaps': [1, 3], 'max_gap_pair': [2, 5]}}
+
+
+def snapshot_files(directory):
+    """{chemin relatif: contenu} de tous les fichiers sous directory"""
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                files[os.path.relpath(path, directory)] = f.read()
+    return files
+
+
+def migrate(tmp_path, source_dir):
+    db = SQLiteStorage(str(tmp_path / 'ecarts_data.db'))
+    try:
+        count = migrate_json(str(source_dir / 'ecarts_data.json'), db, history_dir=str(source_dir / 'history'))
+        return count, db.get_historique(OLD_DAY), db.get_historique(get_current_journee())
+    finally:
+        db.close()
+
+
+def test_json_input_is_unchanged(tmp_path):
+    # Ancien format : historique encore dans le fichier principal, pas de partitions
+    source_dir = tmp_path / 'source'
+    source_dir.mkdir()
+    data = {
+        'historique': {OLD_DAY: {'10:00': {'timestamp': f'{OLD_DAY}T10:00:00', 'gaps': GAPS}}},
+        'config': {'interval_minutes': 30, 'auto_send_enabled': True}
+    }
+    (source_dir / 'ecarts_data.json').write_text(json.dumps(data), encoding='utf-8')
+    before = snapshot_files(source_dir)
+
+    count, old_day, _ = migrate(tmp_path, source_dir)
+
+    assert count == 1
+    assert old_day['10:00']['gaps']['Pair']['gaps'] == [1, 3]
+    assert snapshot_files(source_dir) == before
+
+
+def test_journal_input_is_unchanged(tmp_path):
+    # Snapshot + partitions, puis une entrée de journal et une ligne tronquée
+    source_dir = tmp_path / 'source'
+    source_dir.mkdir()
+    data_file = str(source_dir / 'ecarts_data.json')
+    storage = JournalStorage(data_file, write_behind_delay=0, history_dir=str(source_dir / 'history'))
+    storage.save_analysis('10:00', GAPS)
+    storage.close()
+
+    record = {
+        'op': 'analysis', 'journee': get_current_journee(), 'hour': '11:00',
+        'timestamp': '2026-01-02T11:00:00', 'gaps': encode_gaps_data(GAPS)
+    }
+    with open(f"{data_file}.journal", 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+        f.write('{"op": "analy')
+    before = snapshot_files(source_dir)
+
+    count, _, current_day = migrate(tmp_path, source_dir)
+
+    assert count == 2
+    assert set(current_day) == {'10:00', '11:00'}
+    assert snapshot_files(source_dir) == before
@@ -0,0 +1,152 @@
+"""
+Traces par message : étapes chronométrées, export JSONL tournant
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from config import TRACE_FILE, TRACE_SAMPLE_RATE, TRACE_SLOW_MS, TRACE_MAX_BYTES, TRACE_BACKUP_COUNT
+
+
+class Trace:
+    """
+    Une trace = une opération (message source, envoi planifié) et ses
+    étapes (spans). Les spans sont relatifs au début de la trace, en ms.
+    Rien n'est écrit avant finish().
+    """
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.attrs = attrs
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.spans = []
+        self.error = None
+        self.finished = False
+
+    def _offset_ms(self, instant):
+        return round((instant - self.start) * 1000, 3)
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """Chronomètre un bloc (utilisable dans une coroutine)"""
+        start = time.perf_counter()
+        try:
+            yield attrs
+        except Exception as e:
+            attrs['error'] = str(e)
+            raise
+        finally:
+            self.add_span(name, start, time.perf_counter(), **attrs)
+
+    def add_span(self, name, start, end, **attrs):
+        """Ajoute une étape mesurée ailleurs (instants time.perf_counter)"""
+        span = {'name': name, 'start_ms': self._offset_ms(start), 'duration_ms': round((end - start) * 1000, 3)}
+        if attrs:
+            span['attrs'] = attrs
+        if 'error' in attrs and self.error is None:
+            self.error = attrs['error']
+        self.spans.append(span)
+
+    def finish(self, error=None, **attrs):
+        if self.finished:
+            return
+        self.finished = True
+        if error is not None:
+            self.error = error
+        self.attrs.update(attrs)
+        self.tracer._export(self, (time.perf_counter() - self.start) * 1000)
+
+    def to_dict(self, duration_ms):
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'start': self.started_at.isoformat(timespec='milliseconds'),
+            'duration_ms': round(duration_ms, 3),
+            'error': self.error,
+            'attrs': self.attrs,
+            'spans': sorted(self.spans, key=lambda span: span['start_ms'])
+        }
+
+
+class _NoopTrace:
+    """Trace inerte (traçage désactivé)"""
+    trace_id = None
+
+    @contextmanager
+    def span(self, name, **attrs):
+        yield attrs
+
+    def add_span(self, name, start, end, **attrs):
+        pass
+
+    def finish(self, error=None, **attrs):
+        pass
+
+
+NOOP_TRACE = _NoopTrace()
+
+
+class Tracer:
+    """
+    Crée les traces et écrit celles retenues dans un fichier JSONL tournant
+    (RotatingFileHandler derrière une file : l'écriture se fait dans un
+    thread, jamais dans la boucle asyncio).
+    Échantillonnage à la fin de la trace : on garde une part sample_rate
+    des traces, plus toutes celles en erreur ou plus lentes que slow_ms.
+    """
+
+    def __init__(self, path=TRACE_FILE, sample_rate=TRACE_SAMPLE_RATE, slow_ms=TRACE_SLOW_MS,
+                 max_bytes=TRACE_MAX_BYTES, backup_count=TRACE_BACKUP_COUNT):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.exported = 0
+        self.sampled_out = 0
+        self._listener = None
+        self._writer = None
+        if path:
+            handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            trace_queue = queue.SimpleQueue()
+            self._writer = logging.getLogger(f"ecarts_traces.{id(self)}")
+            self._writer.setLevel(logging.INFO)
+            self._writer.propagate = False
+            self._writer.handlers = [logging.handlers.QueueHandler(trace_queue)]
+            self._listener = logging.handlers.QueueListener(trace_queue, handler)
+            self._listener.start()
+
+    def start_trace(self, name, **attrs):
+        if self._writer is None:
+            return NOOP_TRACE
+        return Trace(self, name, attrs)
+
+    def _export(self, trace, duration_ms):
+        keep = trace.error is not None or duration_ms >= self.slow_ms or random.random() < self.sample_rate
+        if not keep:
+            self.sampled_out += 1
+            return
+        self.exported += 1
+        self._writer.info(json.dumps(trace.to_dict(duration_ms), ensure_ascii=False, default=str))
+
+    def stats(self):
+        return {
+            'file': self.path or None,
+            'sample_rate': self.sample_rate,
+            'exported': self.exported,
+            'sampled_out': self.sampled_out
+        }
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None